@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from openai.types.chat import ChatCompletion
+from openai.types.responses import Response
+
+from single_flight import request_key
+
+# Response model used to rebuild each API's recorded responses
+RESPONSE_TYPES = {"chat.completions": ChatCompletion, "responses": Response}
+
+
+class CassetteMiss(KeyError):
+    """Raised on replay when the cassette has no response for a request."""
+
+
+class Cassette:
+    """Records model API exchanges to a directory and replays them offline.
+
+    Each distinct request (by its canonical JSON, see single_flight.request_key)
+    is stored in its own JSON file named after the request's hash, holding the
+    request and every response recorded for it with its latency. On replay,
+    the n-th identical request gets the n-th recorded response, cycling when
+    a request is sent more often than it was recorded.
+
+    Args:
+        directory: Cassette directory, created when recording
+        mode: "record" or "replay"
+        pacing: On replay, sleep this multiple of each recorded latency
+            before returning (0 returns immediately)
+    """
+
+    def __init__(self, directory: str, mode: str, pacing: float = 0.0):
+        self.directory = directory
+        self.mode = mode
+        self.pacing = pacing
+        self._lock = threading.Lock()
+        self._replayed: Dict[str, int] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if mode == "record":
+            os.makedirs(directory, exist_ok=True)
+        elif not os.path.isdir(directory):
+            raise FileNotFoundError(f"Cassette directory {directory} does not exist")
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def call(
+        self, api: str, request_params: Dict[str, Any], send: Callable[[], Any]
+    ) -> Any:
+        """Return the response to a request, recording or replaying it.
+
+        Args:
+            api: Resource path of the create method, e.g. "chat.completions"
+            request_params: Keyword arguments of the create call
+            send: Sends the request to the endpoint (used when recording)
+
+        Raises:
+            CassetteMiss: On replay, if the request was never recorded
+        """
+        key = request_key(api, request_params)
+        if key is None:
+            raise ValueError(f"Cannot key {api} request for the cassette")
+        if self.mode == "replay":
+            return self._replay(api, key)
+
+        start = time.perf_counter()
+        resp = send()
+        self._record(api, key, resp, time.perf_counter() - start)
+        return resp
+
+    def _record(self, api: str, key: str, resp: Any, latency: float):
+        path = self._path(key)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = {
+                    "api": api,
+                    "request": json.loads(key.split(":", 1)[1]),
+                    "responses": [],
+                }
+                self._entries[path] = entry
+            entry["responses"].append(
+                {
+                    "response": resp.model_dump(mode="json"),
+                    "latency_seconds": round(latency, 6),
+                }
+            )
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+
+    def _replay(self, api: str, key: str) -> Any:
+        path = self._path(key)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                try:
+                    with open(path, "r") as f:
+                        entry = json.load(f)
+                except FileNotFoundError:
+                    raise CassetteMiss(
+                        f"No recorded {api} response for this request in {self.directory}"
+                    ) from None
+                self._entries[path] = entry
+            responses: List[Dict[str, Any]] = entry["responses"]
+            index = self._replayed.get(path, 0)
+            self._replayed[path] = index + 1
+            recorded = responses[index % len(responses)]
+
+        if self.pacing > 0:
+            time.sleep(recorded["latency_seconds"] * self.pacing)
+        return RESPONSE_TYPES[api].model_validate(recorded["response"])
+
+    def report(self) -> str:
+        """Format the number of exchanges recorded or replayed, for the end of a run."""
+        with self._lock:
+            if self.mode == "record":
+                count = sum(len(e["responses"]) for e in self._entries.values())
+                return f"Cassette: recorded {count} responses to {self.directory}"
+            count = sum(self._replayed.values())
+            return f"Cassette: replayed {count} responses from {self.directory}"
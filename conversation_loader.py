@@ -0,0 +1,195 @@
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+import yaml
+
+# Use the libyaml-based loader when PyYAML was built with it
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def parse_sample_ids(spec: str) -> Set[int]:
+    """Parse a sample selection such as "1,3,5-10" into a set of sample IDs.
+
+    Args:
+        spec: Comma-separated sample IDs and inclusive ranges
+
+    Returns:
+        Set of selected sample IDs
+
+    Raises:
+        ValueError: If an item is not an integer or a valid range
+    """
+    selected = set()
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "-" in item:
+            start, end = (int(part) for part in item.split("-", 1))
+            if start > end:
+                raise ValueError(f"Invalid sample range: {item}")
+            selected.update(range(start, end + 1))
+        else:
+            selected.add(int(item))
+    return selected
+
+
+def format_sample_ids(sample_ids: Iterable[int]) -> str:
+    """Format sample IDs as a selection string, the inverse of parse_sample_ids.
+
+    Consecutive IDs are collapsed into ranges, e.g. [1, 3, 4, 5] -> "1,3-5".
+    """
+    parts = []
+    ids = sorted(set(sample_ids))
+    start = 0
+    for i in range(1, len(ids) + 1):
+        if i == len(ids) or ids[i] != ids[i - 1] + 1:
+            first, last = ids[start], ids[i - 1]
+            parts.append(str(first) if first == last else f"{first}-{last}")
+            start = i
+    return ",".join(parts)
+
+
+def iter_conversations(
+    filename: str, selected_samples: Optional[Set[int]] = None
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Lazily yield (sample_id, conversation) pairs from a conversations file.
+
+    Sample IDs are 1-based positions in the file. Conversations outside
+    selected_samples are skipped without being constructed, and reading stops
+    once every selected sample has been yielded.
+
+    Args:
+        filename: YAML file with a top-level `conversations:` list, or a JSONL
+            file (.jsonl) with one conversation object per line
+        selected_samples: Sample IDs to yield; all samples when empty or None
+
+    Returns:
+        Iterator of (sample_id, conversation dict) tuples
+    """
+    if os.path.splitext(filename)[1] == ".jsonl":
+        return _iter_jsonl_conversations(filename, selected_samples)
+    return _iter_yaml_conversations(filename, selected_samples)
+
+
+def _iter_jsonl_conversations(filename, selected_samples):
+    last_sample = max(selected_samples) if selected_samples else None
+    sample_id = 0
+    with open(filename, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            sample_id += 1
+            if selected_samples and sample_id not in selected_samples:
+                if sample_id > last_sample:
+                    return
+                continue
+            yield sample_id, json.loads(line)
+
+
+def _iter_yaml_conversations(filename, selected_samples):
+    last_sample = max(selected_samples) if selected_samples else None
+    with open(filename, "r") as f:
+        loader = YamlLoader(f)
+        try:
+            loader.get_event()  # StreamStartEvent
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()  # DocumentStartEvent
+            if not loader.check_event(yaml.MappingStartEvent):
+                raise yaml.YAMLError(f"{filename}: expected a top-level mapping")
+            loader.get_event()
+
+            anchors = {}
+            while not loader.check_event(yaml.MappingEndEvent):
+                key = _compose(loader, anchors)
+                if key.value != "conversations":
+                    _skip(loader, anchors)
+                    continue
+
+                if not loader.check_event(yaml.SequenceStartEvent):
+                    raise yaml.YAMLError(f"{filename}: 'conversations' must be a list")
+                loader.get_event()
+                sample_id = 0
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    sample_id += 1
+                    if selected_samples and sample_id not in selected_samples:
+                        if sample_id > last_sample:
+                            return
+                        _skip(loader, anchors)
+                        continue
+                    node = _compose(loader, anchors)
+                    yield sample_id, loader.construct_document(node)
+                return
+        finally:
+            loader.dispose()
+
+
+def _compose(loader, anchors) -> yaml.Node:
+    """Build the node for the next value from parser events."""
+    event = loader.get_event()
+    if isinstance(event, yaml.AliasEvent):
+        if event.anchor not in anchors:
+            raise yaml.composer.ComposerError(
+                None, None, f"found undefined alias {event.anchor}", event.start_mark
+            )
+        return anchors[event.anchor]
+
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(
+            tag, event.value, event.start_mark, event.end_mark, style=event.style
+        )
+    elif isinstance(event, yaml.SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(
+            tag, [], event.start_mark, None, flow_style=event.flow_style
+        )
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(event, yaml.MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == "!":
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(
+            tag, [], event.start_mark, None, flow_style=event.flow_style
+        )
+        while not loader.check_event(yaml.MappingEndEvent):
+            item_key = _compose(loader, anchors)
+            item_value = _compose(loader, anchors)
+            node.value.append((item_key, item_value))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        raise yaml.composer.ComposerError(
+            None, None, f"unexpected {type(event).__name__}", event.start_mark
+        )
+
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def _skip(loader, anchors):
+    """Consume the next value without building it, except anchored parts."""
+    depth = 0
+    while True:
+        event = loader.peek_event()
+        if getattr(event, "anchor", None) is not None and not isinstance(
+            event, yaml.AliasEvent
+        ):
+            # Later conversations may refer to this anchor
+            _compose(loader, anchors)
+        else:
+            loader.get_event()
+            if isinstance(event, (yaml.SequenceStartEvent, yaml.MappingStartEvent)):
+                depth += 1
+            elif isinstance(event, (yaml.SequenceEndEvent, yaml.MappingEndEvent)):
+                depth -= 1
+        if depth == 0:
+            return
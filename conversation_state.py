@@ -0,0 +1,122 @@
+import json
+from typing import Any, Dict, Iterable, List, Set
+
+
+def serialize_message(msg) -> Dict[str, Any]:
+    """Convert a message dict or API message object to its logged/wire form.
+
+    Only role, content, tool_calls and tool_call_id are kept, and null fields
+    are dropped.
+    """
+    message_dict = {}
+    # Handle both dicts and objects
+    if isinstance(msg, dict):
+        role = msg.get("role")
+        if role is not None:
+            message_dict["role"] = role
+        content = msg.get("content")
+        if content is not None:
+            message_dict["content"] = content
+        tool_calls_val = msg.get("tool_calls")
+        if tool_calls_val:
+            message_dict["tool_calls"] = [
+                tc.model_dump() if hasattr(tc, "model_dump") else tc
+                for tc in tool_calls_val
+            ]
+        tool_call_id = msg.get("tool_call_id")
+        if tool_call_id is not None:
+            message_dict["tool_call_id"] = tool_call_id
+    else:
+        role = getattr(msg, "role", None)
+        if role is not None:
+            message_dict["role"] = role
+        content = getattr(msg, "content", None)
+        if content is not None:
+            message_dict["content"] = content
+        tool_calls_val = getattr(msg, "tool_calls", None)
+        if tool_calls_val:
+            message_dict["tool_calls"] = [
+                tc.model_dump() if hasattr(tc, "model_dump") else tc
+                for tc in tool_calls_val
+            ]
+        tool_call_id = getattr(msg, "tool_call_id", None)
+        if tool_call_id is not None:
+            message_dict["tool_call_id"] = tool_call_id
+    return message_dict
+
+
+def encode_messages(messages: Iterable[Any]) -> List[str]:
+    """JSON-encode the non-empty wire forms of a list of messages."""
+    encoded = []
+    for msg in messages:
+        message_dict = serialize_message(msg)
+        if message_dict:  # Only append if we have any non-null fields
+            encoded.append(json.dumps(message_dict))
+    return encoded
+
+
+def _summarize(message_dict: Dict[str, Any]) -> str:
+    # One-line description used in the per-turn DEBUG console log
+    role = message_dict.get("role", "unknown")
+    if message_dict.get("content"):
+        return f"{role} - {str(message_dict['content'])[:50]}..."
+    if message_dict.get("tool_calls"):
+        functions = [tc.get("function", {}) for tc in message_dict["tool_calls"]]
+        tool_calls_str = ",".join(
+            f"{fn.get('name', 'unknown')}({fn.get('arguments', {})})"
+            for fn in functions
+        )
+        return f"{role} - tool_calls: {tool_calls_str}"
+    return f"{role} - no content"
+
+
+class ConversationState:
+    """Chat history that converts each message to wire form once.
+
+    Messages may be plain dicts or API objects such as ChatCompletionMessage.
+    On append, each is converted with serialize_message and its JSON encoding
+    and debug summary are cached, so request bodies and log lines reuse those
+    pieces instead of re-dumping the whole history every turn.
+    """
+
+    def __init__(self):
+        self._wire: List[Dict[str, Any]] = []
+        self._encoded: List[str] = []
+        self._summaries: List[str] = []
+        self._tool_response_ids: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._wire)
+
+    def append(self, msg):
+        """Add a message to the end of the history."""
+        self.insert(len(self._wire), msg)
+
+    def insert(self, index: int, msg):
+        """Add a message at a position in the history (e.g. a system prompt at 0)."""
+        message_dict = serialize_message(msg)
+        self._wire.insert(index, message_dict)
+        self._encoded.insert(index, json.dumps(message_dict) if message_dict else "")
+        self._summaries.insert(index, _summarize(message_dict))
+        if message_dict.get("role") == "tool":
+            self._tool_response_ids.add(message_dict.get("tool_call_id"))
+
+    def first_role(self):
+        """Return the role of the first message, or None for an empty history."""
+        return self._wire[0].get("role") if self._wire else None
+
+    def has_tool_response(self, call_id: str) -> bool:
+        """Return True if a tool message answers the given tool call."""
+        return call_id in self._tool_response_ids
+
+    def wire_messages(self) -> List[Dict[str, Any]]:
+        """Return the history in wire form for a chat completion request."""
+        return list(self._wire)
+
+    def encoded_messages(self) -> List[str]:
+        """Return the JSON encoding of each non-empty message, for log lines."""
+        return [encoded for encoded in self._encoded if encoded]
+
+    def debug_lines(self) -> List[str]:
+        """Return one indexed summary line per message for the console log."""
+        return [f"  {i}: {summary}" for i, summary in enumerate(self._summaries)]
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import openai
+import yaml
+
+from retry_policy import ERROR_CLASSES
+
+# Errors (left after retries) that count against an endpoint's health; other
+# errors, e.g. a bad request, say nothing about the endpoint
+HEALTH_ERRORS = tuple(
+    error_type
+    for name in ("connection", "timeout", "rate_limit", "server")
+    for error_type in ERROR_CLASSES[name]
+)
+
+
+class Endpoint:
+    """One base URL and API key of a pool, with its routing and health state."""
+
+    def __init__(self, base_url: str, api_key: str, weight: float = 1.0):
+        if weight <= 0:
+            raise ValueError(f"Endpoint {base_url} must have a positive weight")
+        self.base_url = base_url
+        self.weight = weight
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url)
+        self.active = 0
+        self.conversations = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+
+class EndpointPool:
+    """Routes conversations across weighted endpoints, with session affinity.
+
+    Each conversation is assigned the endpoint with the fewest active
+    conversations per unit of weight and keeps it for all of its turns, so a
+    server's prefix cache is hit by the growing history. An endpoint whose
+    requests fail failure_threshold times in a row (after retries) is
+    ejected: new conversations avoid it for cooldown seconds, doubling on
+    each ejection up to max_cooldown. After the cooldown it is tried again,
+    and one more failure ejects it right away; a success makes it healthy.
+    Conversations already on an ejected endpoint stay there. When every
+    endpoint is ejected, the one whose cooldown ends first is used.
+
+    Args:
+        endpoints: Endpoints in priority order for ties
+        failure_threshold: Consecutive failed requests that eject an endpoint
+        cooldown: Seconds an endpoint is ejected for the first time
+        max_cooldown: Cap on the doubled cooldown
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+    ):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.failure_threshold = max(failure_threshold, 1)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._by_client = {id(endpoint.client): endpoint for endpoint in endpoints}
+
+    @property
+    def primary(self) -> Endpoint:
+        """The first endpoint, used for calls that must stay on one account."""
+        return self.endpoints[0]
+
+    @contextmanager
+    def session(self):
+        """Assign an endpoint to a conversation for as long as the block runs.
+
+        Yields:
+            The Endpoint whose client the conversation sends every request to
+        """
+        with self._lock:
+            now = time.monotonic()
+            healthy = [e for e in self.endpoints if e.ejected_until <= now]
+            if healthy:
+                endpoint = min(healthy, key=lambda e: e.active / e.weight)
+            else:
+                endpoint = min(self.endpoints, key=lambda e: e.ejected_until)
+            endpoint.active += 1
+            endpoint.conversations += 1
+        try:
+            yield endpoint
+        finally:
+            with self._lock:
+                endpoint.active -= 1
+
+    def record(self, client, error: Optional[BaseException] = None):
+        """Update the health of the endpoint behind client after a request.
+
+        Args:
+            client: Client the request was sent with
+            error: The error the request failed with, or None on success
+        """
+        endpoint = self._by_client.get(id(client))
+        if endpoint is None or endpoint.client is not client:
+            return
+        with self._lock:
+            if error is None:
+                endpoint.consecutive_failures = 0
+                return
+            if not isinstance(error, HEALTH_ERRORS):
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                self.eject(endpoint)
+
+    def eject(self, endpoint: Endpoint):
+        """Take an endpoint out of rotation for its (growing) cooldown.
+
+        Must be called with the pool's lock held, or before the run starts.
+        """
+        cooldown = min(self.cooldown * 2**endpoint.ejections, self.max_cooldown)
+        endpoint.ejections += 1
+        # The first failure after the cooldown ejects it again
+        endpoint.consecutive_failures = max(
+            endpoint.consecutive_failures, self.failure_threshold
+        )
+        endpoint.ejected_until = time.monotonic() + cooldown
+
+    def report(self) -> str:
+        """Format each endpoint's conversations, failures and ejections."""
+        with self._lock:
+            lines = ["Endpoints:"]
+            for endpoint in self.endpoints:
+                lines.append(
+                    f"  {endpoint.base_url} (weight {endpoint.weight:g}): "
+                    f"{endpoint.conversations} conversations, "
+                    f"{endpoint.failures} failed requests, "
+                    f"ejected {endpoint.ejections} times"
+                )
+        return "\n".join(lines)
+
+
+def load_endpoints(filename: str, default_api_key: Optional[str]) -> List[Endpoint]:
+    """Read an endpoint pool from a YAML file.
+
+    The file has a top-level `endpoints:` list whose entries have a
+    `base_url`, an optional `weight` (default 1) and the API key, either
+    inline as `api_key` or as the name of an environment variable in
+    `api_key_env`. Entries without a key use default_api_key. List the same
+    base_url several times with different keys to spread load over a key pool.
+
+    Raises:
+        ValueError: If an entry is missing its base_url or API key
+    """
+    with open(filename, "r") as f:
+        config: Dict[str, Any] = yaml.safe_load(f) or {}
+    endpoints = []
+    for i, entry in enumerate(config.get("endpoints") or [], 1):
+        if not entry.get("base_url"):
+            raise ValueError(f"Endpoint {i} in {filename} has no base_url")
+        if entry.get("api_key_env"):
+            api_key = os.getenv(entry["api_key_env"])
+        else:
+            api_key = entry.get("api_key", default_api_key)
+        if not api_key:
+            raise ValueError(f"Endpoint {entry['base_url']} has no API key")
+        endpoints.append(
+            Endpoint(entry["base_url"], api_key, float(entry.get("weight", 1)))
+        )
+    if not endpoints:
+        raise ValueError(f"{filename} lists no endpoints")
+    return endpoints
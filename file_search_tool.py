@@ -1,40 +1,243 @@
-from typing import Dict, List, Union
+import array
+import contextlib
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Tuple, Union
 from openai import OpenAI
+from tool_cache import non_cacheable
+from tracing import tracer
 
 
-def create_file_search_function(client: OpenAI, file_paths: List[str]):
-    """Create a file search function with a vector store bound to the provided files.
+# Vector stores created by this tool are tagged so they can be found again
+VECTOR_STORE_NAME = "file_search_store"
+VECTOR_STORE_MARKER = {"created_by": "canary-datasets"}
+# Reused stores expire after this many days without searches
+VECTOR_STORE_EXPIRY_DAYS = 7
+# Untracked stores idle for longer than this are treated as orphans
+ORPHAN_IDLE_SECONDS = 3600
 
-    Args:
-        client: OpenAI client instance
-        file_paths: List of file paths to add to the vector store
+# Background queue for vector store deletions and orphan collection
+_cleanup_queue: "queue.Queue" = queue.Queue()
+_cleanup_thread = None
+_cleanup_thread_lock = threading.Lock()
+
+
+def _run_cleanup_queue():
+    while True:
+        task = _cleanup_queue.get()
+        try:
+            task()
+        except Exception as e:
+            print(f"Warning: Failed to cleanup vector store: {e}")
+        finally:
+            _cleanup_queue.task_done()
+
+
+def _schedule_cleanup(task):
+    """Run task on the background cleanup thread, starting it on first use."""
+    global _cleanup_thread
+    with _cleanup_thread_lock:
+        if _cleanup_thread is None:
+            _cleanup_thread = threading.Thread(
+                target=_run_cleanup_queue, name="vector-store-cleanup", daemon=True
+            )
+            _cleanup_thread.start()
+    _cleanup_queue.put(task)
+
+
+def wait_for_cleanup():
+    """Block until all scheduled vector store deletions have finished."""
+    _cleanup_queue.join()
+
+
+def _create_vector_store(client: OpenAI, file_paths: List[str], content_hash: str):
+    """Create a tagged vector store, upload files as one batch and wait until indexed.
 
     Returns:
-        A file_search function with the vector store already configured
+        The id of a vector store whose files are all processed
     """
-    # Create vector store
-    vector_store = client.vector_stores.create(name="file_search_store")
+    with tracer.span("vector_store_create"):
+        vector_store = client.vector_stores.create(
+            name=VECTOR_STORE_NAME,
+            metadata={**VECTOR_STORE_MARKER, "content_hash": content_hash},
+            expires_after={
+                "anchor": "last_active_at",
+                "days": VECTOR_STORE_EXPIRY_DAYS,
+            },
+        )
 
-    # Upload files to the vector store
-    file_streams = []
     try:
-        for file_path in file_paths:
-            with open(file_path, "rb") as f:
-                file_streams.append(f)
-                # Upload file
-                file_obj = client.files.create(file=f, purpose="assistants")
-                # Add file to vector store
-                client.vector_stores.files.create(
-                    vector_store_id=vector_store.id, file_id=file_obj.id
+        # Upload files concurrently and poll until the batch is indexed
+        with tracer.span("vector_store_upload", files=len(file_paths)):
+            with contextlib.ExitStack() as stack:
+                files = [
+                    stack.enter_context(open(file_path, "rb"))
+                    for file_path in file_paths
+                ]
+                batch = client.vector_stores.file_batches.upload_and_poll(
+                    vector_store_id=vector_store.id, files=files
                 )
-    except Exception as e:
+        if batch.status != "completed" or batch.file_counts.failed:
+            raise RuntimeError(
+                f"Vector store file batch {batch.id} ended with status {batch.status} "
+                f"({batch.file_counts.failed} failed files)"
+            )
+    except Exception:
         # Clean up vector store if file upload fails
+        _schedule_cleanup(lambda: client.vector_stores.delete(vector_store.id))
+        raise
+
+    return vector_store.id
+
+
+class VectorStoreRegistry:
+    """Reuses vector stores across conversations and runs.
+
+    Stores are keyed by the content hash of their file set and recorded in a
+    JSON file, so any conversation (in this or a later run) with the same files
+    searches the existing store instead of uploading them again. With
+    collect_orphans, the first lookup also starts collecting orphaned stores
+    in the background; this is off by default because other machines using
+    the same account keep their own registries, so their live stores look
+    orphaned from here.
+    """
+
+    def __init__(
+        self,
+        client: OpenAI,
+        path: str = ".file_search_stores.json",
+        collect_orphans: bool = False,
+    ):
+        self._client = client
+        self._path = path
+        self._lock = threading.Lock()
+        self._hash_locks: Dict[str, threading.Lock] = {}
+        self._stores: Dict[str, Dict] = {}
+        self._orphans_collected = not collect_orphans
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._stores = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable vector store registry {path}: {e}")
+
+    def get_or_create(self, file_paths: List[str]) -> str:
+        """Return a ready vector store for the files, creating it if needed.
+
+        Args:
+            file_paths: Files the vector store must contain
+
+        Returns:
+            The vector store id
+        """
+        content_hash = _file_set_hash(file_paths)
+        with self._lock:
+            hash_lock = self._hash_locks.setdefault(content_hash, threading.Lock())
+            collect_orphans = not self._orphans_collected
+            self._orphans_collected = True
+        if collect_orphans:
+            collect_orphaned_vector_stores(self._client, self)
+
+        # Only one conversation creates the store for a given file set
+        with hash_lock:
+            entry = self._stores.get(content_hash)
+            if entry and self._is_ready(entry["vector_store_id"]):
+                return entry["vector_store_id"]
+
+            vector_store_id = _create_vector_store(
+                self._client, file_paths, content_hash
+            )
+            with self._lock:
+                self._stores[content_hash] = {
+                    "vector_store_id": vector_store_id,
+                    "files": [os.path.basename(path) for path in file_paths],
+                    "created_at": int(time.time()),
+                }
+                self._save()
+            return vector_store_id
+
+    def vector_store_ids(self) -> set:
+        """Return the ids of all registered vector stores."""
+        with self._lock:
+            return {entry["vector_store_id"] for entry in self._stores.values()}
+
+    def _is_ready(self, vector_store_id: str) -> bool:
         try:
-            client.vector_stores.delete(vector_store.id)
+            vector_store = self._client.vector_stores.retrieve(vector_store_id)
         except Exception:
-            pass
-        raise e
+            return False
+        return vector_store.status == "completed"
+
+    def _save(self):
+        tmp_path = f"{self._path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._stores, f, indent=2)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print(f"Warning: Failed to save vector store registry {self._path}: {e}")
+
+
+def collect_orphaned_vector_stores(client: OpenAI, registry: VectorStoreRegistry):
+    """Delete, in the background, stores this tool created but no longer tracks.
+
+    Stores left behind by interrupted runs carry the VECTOR_STORE_MARKER
+    metadata but are not in the registry. Stores searched within the last
+    ORPHAN_IDLE_SECONDS are kept, since another run may still be using them.
+
+    Args:
+        client: OpenAI client instance
+        registry: Registry of vector stores that are being reused
+    """
+
+    def collect():
+        cutoff = time.time() - ORPHAN_IDLE_SECONDS
+        known_ids = registry.vector_store_ids()
+        for vector_store in client.vector_stores.list(limit=100):
+            metadata = vector_store.metadata or {}
+            if (
+                metadata.get("created_by") == VECTOR_STORE_MARKER["created_by"]
+                and vector_store.id not in known_ids
+                and (vector_store.last_active_at or vector_store.created_at) < cutoff
+            ):
+                client.vector_stores.delete(vector_store.id)
+
+    _schedule_cleanup(collect)
 
+
+def create_file_search_function(
+    client: OpenAI, file_paths: List[str], registry: VectorStoreRegistry = None
+):
+    """Create a file search function with a vector store bound to the provided files.
+
+    Args:
+        client: OpenAI client instance
+        file_paths: List of file paths to add to the vector store
+        registry: Registry to reuse vector stores across conversations and runs;
+            without one a new store is created and deleted at cleanup
+
+    Returns:
+        A file_search function with the vector store already configured
+    """
+    if registry is not None:
+        vector_store_id = registry.get_or_create(file_paths)
+    else:
+        vector_store_id = _create_vector_store(
+            client, file_paths, _file_set_hash(file_paths)
+        )
+
+    @non_cacheable
     def file_search(query: str) -> Dict[str, Union[str, List[str]]]:
         """Search through uploaded files using vector search.
 
@@ -49,9 +252,10 @@ def create_file_search_function(client: OpenAI, file_paths: List[str]):
         """
         try:
             # Use vector store search to find relevant content
-            search_results = client.vector_stores.search(
-                vector_store_id=vector_store.id, query=query
-            )
+            with tracer.span("vector_store_search"):
+                search_results = client.vector_stores.search(
+                    vector_store_id=vector_store_id, query=query
+                )
 
             results = []
             sources = []
@@ -83,24 +287,283 @@ def create_file_search_function(client: OpenAI, file_paths: List[str]):
             }
 
     # Store vector store ID on the function for cleanup
-    file_search._vector_store_id = vector_store.id
+    file_search._vector_store_id = vector_store_id
     file_search._client = client
+    file_search._reused = registry is not None
 
     return file_search
 
 
 def cleanup_file_search_function(file_search_func):
-    """Clean up the vector store associated with a file search function.
+    """Release the vector store associated with a file search function.
+
+    Stores from a registry are kept for reuse. Others are deleted on a
+    background thread so cleanup stays off the conversation's critical path;
+    call wait_for_cleanup() before exiting.
 
     Args:
         file_search_func: The file search function returned by create_file_search_function
     """
+    if getattr(file_search_func, "_reused", False):
+        return
     if hasattr(file_search_func, "_vector_store_id") and hasattr(
         file_search_func, "_client"
     ):
+        client = file_search_func._client
+        vector_store_id = file_search_func._vector_store_id
+        _schedule_cleanup(lambda: client.vector_stores.delete(vector_store_id))
+
+
+# Local BM25 backend parameters
+LOCAL_INDEX_VERSION = 1
+CHUNK_WORDS = 200
+CHUNK_OVERLAP_WORDS = 50
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Indexes already opened by this process, keyed by content hash
+_local_indexes: Dict[str, "LocalSearchIndex"] = {}
+_local_indexes_lock = threading.Lock()
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _chunk_text(text: str) -> List[str]:
+    """Split text into overlapping windows of CHUNK_WORDS words, keeping its layout."""
+    words = [match.span() for match in re.finditer(r"\S+", text)]
+    step = CHUNK_WORDS - CHUNK_OVERLAP_WORDS
+    chunks = []
+    for start in range(0, len(words), step):
+        window = words[start : start + CHUNK_WORDS]
+        chunks.append(text[window[0][0] : window[-1][1]])
+        if start + CHUNK_WORDS >= len(words):
+            break
+    return chunks
+
+
+def _file_set_hash(file_paths: List[str]) -> str:
+    """Hash the names and contents of a set of files, independent of order."""
+    digests = []
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+        digests.append(f"{os.path.basename(file_path)}:{content_hash}")
+    return hashlib.sha256("\n".join(sorted(digests)).encode()).hexdigest()
+
+
+class LocalSearchIndex:
+    """BM25 index over chunks of local files, persisted as memory-mapped files.
+
+    On disk an index is a directory with:
+        - meta.json: sources, chunk offsets and lengths, and the vocabulary
+          mapping each term to its postings offset and document frequency
+        - postings.bin: uint32 (chunk_id, term frequency) pairs per term
+        - chunks.txt: UTF-8 text of all chunks, concatenated
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self._sources = meta["sources"]
+        self._chunks = meta["chunks"]
+        self._terms = meta["terms"]
+        self._avgdl = meta["avgdl"]
+        self._postings = self._map(os.path.join(path, "postings.bin")).cast("I")
+        self._text = self._map(os.path.join(path, "chunks.txt"))
+
+    @staticmethod
+    def _map(file_path: str) -> memoryview:
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def build(cls, file_paths: List[str], path: str):
+        """Chunk and index files, writing the index directory at path.
+
+        Args:
+            file_paths: Files to index
+            path: Index directory to create
+        """
+        sources = []
+        chunks = []
+        text_parts = []
+        text_offset = 0
+        term_postings: Dict[str, List[int]] = {}
+        for file_path in file_paths:
+            sources.append(os.path.basename(file_path))
+            with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+            for chunk in _chunk_text(text):
+                chunk_id = len(chunks)
+                tokens = _tokenize(chunk)
+                encoded = chunk.encode("utf-8")
+                chunks.append(
+                    [len(sources) - 1, text_offset, len(encoded), len(tokens)]
+                )
+                text_parts.append(encoded)
+                text_offset += len(encoded)
+                for term, tf in Counter(tokens).items():
+                    term_postings.setdefault(term, []).extend((chunk_id, tf))
+
+        postings = array.array("I")
+        terms = {}
+        for term, pairs in term_postings.items():
+            terms[term] = [len(postings) // 2, len(pairs) // 2]
+            postings.extend(pairs)
+        avgdl = sum(chunk[3] for chunk in chunks) / len(chunks) if chunks else 0.0
+
+        # Write to a temporary directory and rename so readers never see a partial index
+        tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(path))
         try:
-            file_search_func._client.vector_stores.delete(
-                file_search_func._vector_store_id
+            with open(os.path.join(tmp_path, "postings.bin"), "wb") as f:
+                postings.tofile(f)
+            with open(os.path.join(tmp_path, "chunks.txt"), "wb") as f:
+                f.write(b"".join(text_parts))
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(
+                    {
+                        "version": LOCAL_INDEX_VERSION,
+                        "sources": sources,
+                        "chunks": chunks,
+                        "terms": terms,
+                        "avgdl": avgdl,
+                    },
+                    f,
+                )
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process finished the same index first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    def search(self, query: str, max_results: int = 10) -> List[Tuple[str, str]]:
+        """Rank chunks against a query with BM25.
+
+        Args:
+            query: The search query
+            max_results: Maximum number of chunks to return
+
+        Returns:
+            List of (source file name, chunk text) tuples, best match first
+        """
+        num_chunks = len(self._chunks)
+        scores: Dict[int, float] = {}
+        for term in set(_tokenize(query)):
+            entry = self._terms.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            idf = math.log(1 + (num_chunks - df + 0.5) / (df + 0.5))
+            pairs = self._postings[2 * offset : 2 * (offset + df)]
+            for i in range(0, len(pairs), 2):
+                chunk_id, tf = pairs[i], pairs[i + 1]
+                doc_len = self._chunks[chunk_id][3]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / self._avgdl)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (
+                    BM25_K1 + 1
+                ) / (tf + norm)
+
+        ranked = heapq.nlargest(max_results, scores.items(), key=lambda item: item[1])
+        results = []
+        for chunk_id, _ in ranked:
+            source_id, text_offset, text_len, _ = self._chunks[chunk_id]
+            text = bytes(self._text[text_offset : text_offset + text_len]).decode(
+                "utf-8"
             )
+            results.append((self._sources[source_id], text))
+        return results
+
+
+def load_local_search_index(
+    file_paths: List[str], index_dir: str = ".file_search_index"
+) -> LocalSearchIndex:
+    """Open the BM25 index for a set of files, building it on first use.
+
+    Indexes are stored under index_dir keyed by the hash of the file contents,
+    so they are reused by later conversations, processes and runs until one of
+    the files changes.
+
+    Args:
+        file_paths: Files to search
+        index_dir: Directory holding persisted indexes
+
+    Returns:
+        The LocalSearchIndex for these files
+    """
+    key = f"v{LOCAL_INDEX_VERSION}-{_file_set_hash(file_paths)}"
+    with _local_indexes_lock:
+        index = _local_indexes.get(key)
+        if index is None:
+            path = os.path.join(index_dir, key)
+            if not os.path.isdir(path):
+                os.makedirs(index_dir, exist_ok=True)
+                with tracer.span("local_index_build", files=len(file_paths)):
+                    LocalSearchIndex.build(file_paths, path)
+            index = LocalSearchIndex(path)
+            _local_indexes[key] = index
+    return index
+
+
+def create_local_file_search_function(
+    file_paths: List[str], index_dir: str = ".file_search_index", max_results: int = 10
+):
+    """Create a file search function backed by a local BM25 index.
+
+    Works offline and against any endpoint. Returns the same result shape as
+    the vector store backend from create_file_search_function.
+
+    Args:
+        file_paths: List of file paths to search
+        index_dir: Directory holding persisted indexes
+        max_results: Maximum number of snippets returned per query
+
+    Returns:
+        A file_search function bound to the index for these files
+    """
+    index = load_local_search_index(file_paths, index_dir)
+
+    @non_cacheable
+    def file_search(query: str) -> Dict[str, Union[str, List[str]]]:
+        """Search through uploaded files using vector search.
+
+        Args:
+            query: The search query to find relevant content in the files
+
+        Returns:
+            Dict containing:
+                - query: The original search query
+                - results: List of relevant text snippets from the files
+                - sources: List of source file names where results were found
+        """
+        try:
+            with tracer.span("local_index_search"):
+                matches = index.search(query, max_results)
+
+            results = []
+            sources = []
+            for source, text in matches:
+                if source not in sources:
+                    sources.append(source)
+                results.append(text)
+
+            return {
+                "query": query,
+                "results": results if results else ["No relevant content found"],
+                "sources": sources,
+            }
+
         except Exception as e:
-            print(f"Warning: Failed to cleanup vector store: {e}")
+            return {
+                "query": query,
+                "results": [f"Error during search: {str(e)}"],
+                "sources": [],
+            }
+
+    return file_search
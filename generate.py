@@ -10,28 +10,80 @@
 # ///
 
 import argparse
-import copy
 import datetime
 import inspect
+import itertools
 import json
 import os
+import signal
 import sys
 import threading
-from concurrent.futures import as_completed, ThreadPoolExecutor
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import Any, Dict, get_args, get_type_hints, List, Literal, Type, Union
 
-import openai
+from openai.types.chat import ChatCompletion
 
 # Import sample tools and create executor
 import sample_tools
-import yaml
-from file_search_tool import cleanup_file_search_function, create_file_search_function
+from cassette import Cassette
+from conversation_loader import iter_conversations, parse_sample_ids
+from conversation_state import ConversationState, encode_messages
+from endpoint_pool import Endpoint, EndpointPool, load_endpoints
+from live_score import LiveScorer
+from scheduling import (
+    LONGEST_FIRST_WINDOW,
+    iter_longest_first,
+    load_sample_durations,
+    load_turn_seconds,
+    order_longest_first,
+    order_stratified,
+)
+from retry_policy import ERROR_CLASSES, RetryPolicy
+from run_metrics import RunMetrics
+from run_planner import estimate_tokens, format_plan, plan_run
+from score import load_conversation_logs
+from single_flight import request_key, SingleFlight
+import tool_cache
+from file_search_tool import (
+    cleanup_file_search_function,
+    create_file_search_function,
+    create_local_file_search_function,
+    VectorStoreRegistry,
+    wait_for_cleanup,
+)
 from rich.pretty import pprint
 from tqdm import tqdm
+from prefetch import Prefetcher
+from profiling import profiler
+from resume import find_unfinished, load_finished_turns, write_unfinished_summary
+from tracing import tracer
+from turn_limits import TurnLimits
+from usage_stats import UsageStats
 
 # Thread-safe logging
 log_file_lock = threading.Lock()
 
+# Sampling parameters added to every model request (e.g. temperature)
+sampling_params = {}
+
+# Shares one in-flight API call among identical concurrent requests
+api_coalescer = SingleFlight()
+
+# Token usage and prompt cache hits across the run
+usage_stats = UsageStats()
+
+# Live request, token and progress metrics (--metrics-file, --metrics-port)
+run_metrics = RunMetrics(usage_stats)
+
+# Scores logged turns against --golden as the run progresses
+live_scorer = None
+
+# Records or replays model API exchanges (--record, --replay)
+cassette = None
+# Prepares file search for queued conversations; set up before processing
+resource_prefetcher = None
+
 
 def log_message(message, console_log_filename=None, prefix="INFO"):
     """Log message to separate console log file as plain text."""
@@ -39,7 +91,7 @@ def log_message(message, console_log_filename=None, prefix="INFO"):
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         log_line = f"[{timestamp}] {prefix}: {message}"
 
-        with log_file_lock:
+        with tracer.span("log_message"), log_file_lock:
             try:
                 with open(console_log_filename, "a") as f:
                     f.write(log_line + "\n")
@@ -49,52 +101,128 @@ def log_message(message, console_log_filename=None, prefix="INFO"):
 
 
 def map_with_progress(
-    func, items, num_threads=4, desc="Processing", disable_progress=False
+    func,
+    items,
+    num_threads=4,
+    desc="Processing",
+    disable_progress=False,
+    postfix=None,
+    total=None,
+    max_pending=None,
 ):
     """
     Apply func to each item in items using ThreadPoolExecutor with progress tracking.
 
+    Items are pulled lazily and at most max_pending are submitted at a time,
+    so memory stays bounded however many items the iterable yields. Results
+    are yielded as they complete and are not kept.
+
     Args:
         func: Function to apply to each item
-        items: List of items to process
+        items: Iterable of items to process, consumed lazily
         num_threads: Number of threads to use (default: 4)
         desc: Description for progress bar
         disable_progress: If True, don't show progress bar
-
-    Returns:
-        List of results in the same order as input items
+        postfix: Optional callable returning text shown after the progress
+            bar, refreshed as items complete
+        total: Number of items, if known, for the progress bar
+        max_pending: Maximum items submitted but not yet finished
+            (default: twice num_threads)
+
+    Yields:
+        Results in completion order (in input order when run sequentially);
+        None for items whose func raised
     """
     if os.getenv("debug") or num_threads == 1:
         # Sequential processing for debug or single thread
-        if disable_progress:
-            return [func(item) for item in items]
-        else:
-            return [func(item) for item in tqdm(items, desc=desc)]
-
-    results = [None] * len(items)
-
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        # Submit all tasks
-        future_to_index = {}
-        for i, item in enumerate(items):
-            future = executor.submit(func, item)
-            future_to_index[future] = i
+        for item in tqdm(items, desc=desc, total=total, disable=disable_progress):
+            yield func(item)
+        return
+
+    if max_pending is None:
+        max_pending = num_threads * 2
+    items = iter(items)
+
+    with (
+        ThreadPoolExecutor(max_workers=num_threads) as executor,
+        tqdm(total=total, desc=desc, disable=disable_progress) as progress_bar,
+    ):
+        # Only the submitted window is tracked; more items are pulled as it drains
+        pending = {}
+        submitted = 0
+        for item in itertools.islice(items, max_pending):
+            pending[executor.submit(func, item)] = submitted
+            submitted += 1
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    tqdm.write(f"Error processing item {index}: {e}")
+                    result = None
+                progress_bar.update(1)
+                if postfix is not None:
+                    progress_bar.set_postfix_str(postfix())
+                yield result
 
-        # Collect results with progress tracking
-        progress_bar = tqdm(total=len(items), desc=desc, disable=disable_progress)
+            for item in itertools.islice(items, max_pending - len(pending)):
+                pending[executor.submit(func, item)] = submitted
+                submitted += 1
 
-        for future in as_completed(future_to_index):
-            index = future_to_index[future]
-            try:
-                results[index] = future.result()
-            except Exception as e:
-                print(f"\nError processing item {index}: {e}")
-                results[index] = None
-            progress_bar.update(1)
 
-        progress_bar.close()
+def format_turn_entry(
+    sample_id,
+    turn_id,
+    messages,
+    user_message,
+    tool_calls,
+    tool_outputs,
+    assistant_message,
+    available_tools,
+    duration_seconds,
+    status="completed",
+    truncation_reason=None,
+    usage=None,
+    choice_index=None,
+) -> str:
+    """Encode a turn as one JSONL log line.
+
+    Messages from a ConversationState are spliced in from their cached JSON
+    encodings; other message lists are serialized here. choice_index is
+    only written for runs that sample several replies per conversation.
+    """
+    if isinstance(messages, ConversationState):
+        encoded_messages = messages.encoded_messages()
+    else:
+        encoded_messages = encode_messages(messages)
 
-    return results
+    turn_entry = {
+        "user_message": user_message,
+        "tool_calls": tool_calls,
+        "tool_outputs": tool_outputs,
+        "assistant_message": assistant_message,
+        "available_tools": available_tools if available_tools else [],
+        "status": status,
+    }
+    if truncation_reason is not None:
+        turn_entry["truncation_reason"] = truncation_reason
+    if usage is not None:
+        turn_entry["usage"] = usage
+    if duration_seconds is not None:
+        turn_entry["duration_seconds"] = round(duration_seconds, 3)
+
+    # Same layout as json.dumps of the entry with messages as the third field
+    head = {"sample_id": sample_id, "turn_id": turn_id}
+    if choice_index is not None:
+        head["choice_index"] = choice_index
+    head = json.dumps(head)
+    return (
+        f'{head[:-1]}, "messages": [{", ".join(encoded_messages)}], '
+        f"{json.dumps(turn_entry)[1:]}"
+    )
 
 
 def thread_safe_log_turn(
@@ -108,77 +236,97 @@ def thread_safe_log_turn(
     model_name=None,
     log_filename=None,
     available_tools=None,
+    duration_seconds=None,
+    status="completed",
+    truncation_reason=None,
+    usage=None,
+    choice_index=None,
 ):
     """Thread-safe version of log_turn."""
-    # Convert messages to serializable format
-    serializable_messages = []
-    for msg in messages:
-        message_dict = {}
-        # Handle both dicts and objects
-        if isinstance(msg, dict):
-            role = msg.get("role")
-            if role is not None:
-                message_dict["role"] = role
-            content = msg.get("content")
-            if content is not None:
-                message_dict["content"] = content
-            tool_calls_val = msg.get("tool_calls")
-            if tool_calls_val:
-                message_dict["tool_calls"] = [
-                    tc.model_dump() if hasattr(tc, "model_dump") else tc
-                    for tc in tool_calls_val
-                ]
-            tool_call_id = msg.get("tool_call_id")
-            if tool_call_id is not None:
-                message_dict["tool_call_id"] = tool_call_id
-        else:
-            role = getattr(msg, "role", None)
-            if role is not None:
-                message_dict["role"] = role
-            content = getattr(msg, "content", None)
-            if content is not None:
-                message_dict["content"] = content
-            tool_calls_val = getattr(msg, "tool_calls", None)
-            if tool_calls_val:
-                message_dict["tool_calls"] = [
-                    tc.model_dump() if hasattr(tc, "model_dump") else tc
-                    for tc in tool_calls_val
-                ]
-            tool_call_id = getattr(msg, "tool_call_id", None)
-            if tool_call_id is not None:
-                message_dict["tool_call_id"] = tool_call_id
-        if message_dict:  # Only append if we have any non-null fields
-            serializable_messages.append(message_dict)
-
-    # Create turn entry
-    turn_entry = {
-        "sample_id": sample_id,
-        "turn_id": turn_id,
-        "messages": serializable_messages,
-        "user_message": user_message,
-        "tool_calls": tool_calls,
-        "tool_outputs": tool_outputs,
-        "assistant_message": assistant_message,
-        "available_tools": available_tools if available_tools else [],
-    }
+    with profiler.phase("logging"):
+        log_line = format_turn_entry(
+            sample_id,
+            turn_id,
+            messages,
+            user_message,
+            tool_calls,
+            tool_outputs,
+            assistant_message,
+            available_tools,
+            duration_seconds,
+            status,
+            truncation_reason,
+            usage,
+            choice_index,
+        )
+
+        # Thread-safe file writing
+        with (
+            tracer.span("log_turn", sample_id=sample_id, turn_id=turn_id),
+            log_file_lock,
+        ):
+            try:
+                with open(log_filename, "a") as f:
+                    f.write(log_line + "\n")
+            except Exception as e:
+                print(f"Error writing to log file {log_filename}: {e}")
+                raise
+
+    run_metrics.turn_logged()
+    if live_scorer is not None:
+        with profiler.phase("compare"):
+            try:
+                live_scorer.record(sample_id, turn_id, tool_calls)
+            except Exception as e:
+                # Live scoring is advisory; it must never fail the turn
+                print(
+                    f"Warning: Failed to score turn {turn_id} of sample {sample_id}: {e}"
+                )
 
-    # Thread-safe file writing
-    with log_file_lock:
-        try:
-            with open(log_filename, "a") as f:
-                f.write(json.dumps(turn_entry) + "\n")
-        except Exception as e:
-            print(f"Error writing to log file {log_filename}: {e}")
-            raise
+
+# Tool schemas keyed by (function, chat_format), and system prompts keyed by
+# (py, *tool functions), shared by all executors
+_schema_cache: Dict[Any, Dict[str, Any]] = {}
+_system_prompt_cache: Dict[Any, str] = {}
 
 
 class ToolExecutor:
     """Executes tool calls by mapping function names to registered functions."""
 
-    def __init__(self, *functions):
+    def __init__(
+        self,
+        *functions,
+        max_workers: int = 1,
+        tool_concurrency: Dict[str, int] = None,
+        tool_timeout: float = None,
+        result_cache: "tool_cache.ToolResultCache" = None,
+    ):
+        """Create an executor for the given tool functions.
+
+        Args:
+            *functions: Tool functions to register under their own names
+            max_workers: Size of the pool used to run the tool calls of one
+                assistant message concurrently (1 runs them in order)
+            tool_concurrency: Maximum concurrent executions per tool name,
+                shared by every executor derived from this one
+            tool_timeout: Seconds to wait for a single tool call before
+                reporting it as timed out
+            result_cache: Cache for results of tools not marked non_cacheable
+        """
         self._registered_tools = {}
+        self._schema_lists = {}
         for func in functions:
             self.register(func.__name__, func)
+        self._max_workers = max_workers
+        self._tool_timeout = tool_timeout
+        self._result_cache = result_cache
+        self._tool_semaphores = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in (tool_concurrency or {}).items()
+        }
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._pool_owner = self
 
     def register(self, name: str, func: callable):
         """Register a function with a name.
@@ -188,6 +336,7 @@ class ToolExecutor:
             func: The function to register
         """
         self._registered_tools[name] = func
+        self._schema_lists = {}
 
     def create_filtered_executor(self, tool_names: List[str]) -> "ToolExecutor":
         """Create a new executor with only the specified tools.
@@ -198,94 +347,218 @@ class ToolExecutor:
         Returns:
             New ToolExecutor instance with only the specified tools
         """
+        # Canonical (sorted) order keeps request prefixes identical for equal
+        # tool sets, whatever order the conversation lists them in
         filtered_tools = []
-        for name in tool_names:
+        for name in sorted(tool_names):
             if name in self._registered_tools:
                 filtered_tools.append(self._registered_tools[name])
             else:
                 raise ValueError(f"Tool '{name}' not found")
 
-        return ToolExecutor(*filtered_tools)
+        filtered = ToolExecutor(
+            *filtered_tools,
+            max_workers=self._max_workers,
+            tool_timeout=self._tool_timeout,
+            result_cache=self._result_cache,
+        )
+        # Share the pool and per-tool limits so they bound the whole run
+        filtered._tool_semaphores = self._tool_semaphores
+        filtered._pool_owner = self._pool_owner
+        return filtered
 
     def execute(self, tool_calls: List) -> List[Dict]:
         """Execute a list of tool calls and return their responses.
 
+        Independent calls run concurrently when the executor has more than one
+        worker or a timeout; responses are always returned in call order.
+
         Args:
             tool_calls: List of tool call objects from responses API or chat completions API
 
         Returns:
             List of tool response dictionaries with results
         """
-        tool_responses = []
-
+        tool_calls = list(tool_calls)
+        if self._tool_timeout is not None:
+            return self._execute_with_timeout(tool_calls)
+        if self._max_workers <= 1 or len(tool_calls) <= 1:
+            return [self._execute_one(tool_call) for tool_call in tool_calls]
+
+        pool = self._get_pool()
+        futures = [
+            pool.submit(self._execute_one, tool_call) for tool_call in tool_calls
+        ]
+        return [future.result() for future in futures]
+
+    def _execute_with_timeout(self, tool_calls: List) -> List[Dict]:
+        """Run each tool call on a thread of its own, giving up on it after the timeout.
+
+        Each call's deadline counts from when its thread started, so the calls
+        of one message wait for the timeout at most once between them. A call
+        that timed out keeps running in the background but holds no thread
+        that later calls need.
+        """
+        started = []
         for tool_call in tool_calls:
-            # Support both dict and Pydantic object for chat completions
-            function_name = getattr(tool_call, "name", None)
-            if function_name is None and hasattr(tool_call, "function"):
-                function_name = getattr(tool_call.function, "name", None)
-            arguments = getattr(tool_call, "arguments", None)
-            if arguments is None and hasattr(tool_call, "function"):
-                arguments = getattr(tool_call.function, "arguments", None)
-            if isinstance(arguments, str):
-                try:
-                    arguments = json.loads(arguments)
-                except Exception:
-                    pass
-            if function_name in self._registered_tools:
-                try:
-                    # Convert arguments to expected types
-                    converted_args = self._convert_arguments(function_name, arguments)
-                    result = self._registered_tools[function_name](**converted_args)
-                    tool_responses.append(
-                        {
-                            "type": "function_call_output",
-                            "call_id": getattr(
-                                tool_call, "call_id", getattr(tool_call, "id", None)
-                            ),
-                            "output": json.dumps(result),
-                        }
-                    )
-                except Exception as e:
-                    tool_responses.append(
-                        {
-                            "type": "function_call_output",
-                            "call_id": getattr(
-                                tool_call, "call_id", getattr(tool_call, "id", None)
-                            ),
-                            "output": json.dumps(
-                                f"Error executing {function_name}: {str(e)}"
-                            ),
-                        }
-                    )
-            else:
+            future = Future()
+            threading.Thread(
+                target=self._execute_into,
+                args=(future, tool_call),
+                name="tool",
+                daemon=True,
+            ).start()
+            started.append((time.monotonic() + self._tool_timeout, future))
+
+        tool_responses = []
+        for tool_call, (deadline, future) in zip(tool_calls, started):
+            try:
+                tool_responses.append(
+                    future.result(timeout=max(deadline - time.monotonic(), 0))
+                )
+            except TimeoutError:
+                function_name, _ = self._parse_tool_call(tool_call)
                 tool_responses.append(
                     {
                         "type": "function_call_output",
                         "call_id": getattr(
                             tool_call, "call_id", getattr(tool_call, "id", None)
                         ),
-                        "output": json.dumps(f"Unknown function: {function_name}"),
+                        "output": json.dumps(
+                            f"Error executing {function_name}: timed out after {self._tool_timeout}s"
+                        ),
                     }
                 )
-
         return tool_responses
 
+    def _execute_into(self, future: Future, tool_call):
+        """Run one tool call and settle future with its response."""
+        try:
+            future.set_result(self._execute_one(tool_call))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """Return the tool pool, shared with the executor this one was filtered from."""
+        owner = self._pool_owner
+        with owner._pool_lock:
+            if owner._pool is None:
+                owner._pool = ThreadPoolExecutor(
+                    max_workers=max(owner._max_workers, 1),
+                    thread_name_prefix="tool",
+                )
+            return owner._pool
+
+    def _parse_tool_call(self, tool_call):
+        """Extract the function name and decoded arguments from a tool call."""
+        # Support both dict and Pydantic object for chat completions
+        function_name = getattr(tool_call, "name", None)
+        if function_name is None and hasattr(tool_call, "function"):
+            function_name = getattr(tool_call.function, "name", None)
+        arguments = getattr(tool_call, "arguments", None)
+        if arguments is None and hasattr(tool_call, "function"):
+            arguments = getattr(tool_call.function, "arguments", None)
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except Exception:
+                pass
+        return function_name, arguments
+
+    def _execute_one(self, tool_call) -> Dict:
+        """Execute a single tool call and return its response dictionary."""
+        function_name, arguments = self._parse_tool_call(tool_call)
+        call_id = getattr(tool_call, "call_id", getattr(tool_call, "id", None))
+        if function_name not in self._registered_tools:
+            return {
+                "type": "function_call_output",
+                "call_id": call_id,
+                "output": json.dumps(f"Unknown function: {function_name}"),
+            }
+        try:
+            # Convert arguments to expected types
+            converted_args = self._convert_arguments(function_name, arguments)
+            func = self._registered_tools[function_name]
+
+            # Serve deterministic tools from the result cache when possible
+            cache_key = None
+            if self._result_cache is not None and tool_cache.is_cacheable(func):
+                cache_key = self._result_cache.make_key(
+                    function_name, func, converted_args
+                )
+                if cache_key is not None:
+                    cached = self._result_cache.get(function_name, cache_key)
+                    if cached is not None:
+                        return {
+                            "type": "function_call_output",
+                            "call_id": call_id,
+                            "output": cached[1],
+                        }
+
+            semaphore = self._tool_semaphores.get(function_name)
+            with (
+                tracer.span("tool_call", tool=function_name),
+                profiler.phase("tool execution"),
+            ):
+                if semaphore is None:
+                    result = func(**converted_args)
+                else:
+                    with semaphore:
+                        result = func(**converted_args)
+            output = json.dumps(result)
+            if cache_key is not None:
+                self._result_cache.put(cache_key, result, output)
+            return {
+                "type": "function_call_output",
+                "call_id": call_id,
+                "output": output,
+            }
+        except Exception as e:
+            return {
+                "type": "function_call_output",
+                "call_id": call_id,
+                "output": json.dumps(f"Error executing {function_name}: {str(e)}"),
+            }
+
     def get_tool_schemas(self) -> List[Dict[str, Any]]:
         """Generate OpenAI tool schema for the responses API."""
-        tool_schemas = []
-        for func in self._registered_tools.values():
-            tool_schemas.append(self._generate_tool_schema(func, chat_format=False))
-        return tool_schemas
+        return list(self._cached_schemas(chat_format=False))
 
     def get_chat_tool_schemas(self) -> List[Dict[str, Any]]:
         """Generate OpenAI tool schema for the chat completions API."""
-        tool_schemas = []
-        for func in self._registered_tools.values():
-            tool_schemas.append(self._generate_tool_schema(func, chat_format=True))
-        return tool_schemas
+        return list(self._cached_schemas(chat_format=True))
+
+    def _cached_schemas(self, chat_format: bool) -> List[Dict[str, Any]]:
+        # Schemas are generated once per function and shared by every
+        # executor, so requests with the same tools serialize identically
+        schemas = self._schema_lists.get(chat_format)
+        if schemas is None:
+            schemas = []
+            with profiler.phase("schema build"):
+                for func in self._registered_tools.values():
+                    key = (func, chat_format)
+                    schema = _schema_cache.get(key)
+                    if schema is None:
+                        schema = _schema_cache.setdefault(
+                            key,
+                            self._generate_tool_schema(func, chat_format=chat_format),
+                        )
+                    schemas.append(schema)
+            self._schema_lists[chat_format] = schemas
+        return schemas
 
     def get_system_prompt(self, py: bool = False) -> str:
         """Generate system prompt with tool definitions in JSON format."""
+        key = (py, *self._registered_tools.values())
+        system_prompt = _system_prompt_cache.get(key)
+        if system_prompt is None:
+            with profiler.phase("schema build"):
+                system_prompt = _system_prompt_cache.setdefault(
+                    key, self._build_system_prompt(py)
+                )
+        return system_prompt
+
+    def _build_system_prompt(self, py: bool) -> str:
         system_prompt = """You are a helpful assistant and an expert in function composition. You can answer general questions using your internal knowledge OR invoke functions when necessary. Follow these strict guidelines:
 
 1. FUNCTION CALLS:
@@ -539,82 +812,106 @@ def log_turn(
     model_name=None,
     log_filename=None,
     available_tools=None,
+    duration_seconds=None,
+    status="completed",
+    truncation_reason=None,
+    usage=None,
 ):
     """Log a complete turn with all its data."""
-    # Convert messages to serializable format
-    serializable_messages = []
-    for msg in messages:
-        message_dict = {}
-        # Handle both dicts and objects
-        if isinstance(msg, dict):
-            role = msg.get("role")
-            if role is not None:
-                message_dict["role"] = role
-            content = msg.get("content")
-            if content is not None:
-                message_dict["content"] = content
-            tool_calls_val = msg.get("tool_calls")
-            if tool_calls_val:
-                message_dict["tool_calls"] = [
-                    tc.model_dump() if hasattr(tc, "model_dump") else tc
-                    for tc in tool_calls_val
-                ]
-            tool_call_id = msg.get("tool_call_id")
-            if tool_call_id is not None:
-                message_dict["tool_call_id"] = tool_call_id
-        else:
-            role = getattr(msg, "role", None)
-            if role is not None:
-                message_dict["role"] = role
-            content = getattr(msg, "content", None)
-            if content is not None:
-                message_dict["content"] = content
-            tool_calls_val = getattr(msg, "tool_calls", None)
-            if tool_calls_val:
-                message_dict["tool_calls"] = [
-                    tc.model_dump() if hasattr(tc, "model_dump") else tc
-                    for tc in tool_calls_val
-                ]
-            tool_call_id = getattr(msg, "tool_call_id", None)
-            if tool_call_id is not None:
-                message_dict["tool_call_id"] = tool_call_id
-        if message_dict:  # Only append if we have any non-null fields
-            serializable_messages.append(message_dict)
-    # Create turn entry
-    turn_entry = {
-        "sample_id": sample_id,
-        "turn_id": turn_id,
-        "messages": serializable_messages,
-        "user_message": user_message,
-        "tool_calls": tool_calls,
-        "tool_outputs": tool_outputs,
-        "assistant_message": assistant_message,
-        "available_tools": available_tools if available_tools else [],
-    }
+    with profiler.phase("logging"):
+        log_line = format_turn_entry(
+            sample_id,
+            turn_id,
+            messages,
+            user_message,
+            tool_calls,
+            tool_outputs,
+            assistant_message,
+            available_tools,
+            duration_seconds,
+            status,
+            truncation_reason,
+            usage,
+        )
+
+        try:
+            with tracer.span("log_turn", sample_id=sample_id, turn_id=turn_id):
+                with open(log_filename, "a") as f:
+                    f.write(log_line + "\n")
+        except Exception as e:
+            print(f"Error writing to log file {log_filename}: {e}")
+            sys.exit(1)
+
+    run_metrics.turn_logged()
+    if live_scorer is not None:
+        with profiler.phase("compare"):
+            try:
+                live_scorer.record(sample_id, turn_id, tool_calls)
+            except Exception as e:
+                # Live scoring is advisory; it must never fail the turn
+                print(
+                    f"Warning: Failed to score turn {turn_id} of sample {sample_id}: {e}"
+                )
+
 
+def send_model_request(client, api, request_params):
+    """Send a model request under the retry policy, through the cassette if one is set.
+
+    The request is counted in the run metrics, and its outcome is recorded
+    against the health of the client's endpoint.
+    """
     try:
-        with open(log_filename, "a") as f:
-            f.write(json.dumps(turn_entry) + "\n")
+        with run_metrics.request():
+            if cassette is None:
+                resp = retry_policy.call(client, api, request_params)
+            else:
+                resp = cassette.call(
+                    api,
+                    request_params,
+                    lambda: retry_policy.call(client, api, request_params),
+                )
     except Exception as e:
-        print(f"Error writing to log file {log_filename}: {e}")
-        sys.exit(1)
+        endpoint_pool.record(client, e)
+        raise
+    endpoint_pool.record(client)
+    return resp
 
 
 def execute_response_turn(
-    client, model, executor, previous_id, user_message, sample_id, turn_id
+    client,
+    model,
+    executor,
+    previous_id,
+    user_message,
+    sample_id,
+    turn_id,
+    budget=None,
+    carried_inputs=None,
 ):
-    inputs = [
+    # Tool outputs left unsent by a truncated previous turn go first
+    inputs = list(carried_inputs or [])
+    inputs.append(
         {
             "type": "message",
             "role": "user",
             "content": [{"type": "input_text", "text": user_message}],
         }
-    ]
+    )
+    sent_inputs = 0
 
     all_tool_calls = []
     all_tool_outputs = []
 
     while True:
+        if budget is not None and budget.check():
+            return (
+                None,
+                previous_id,
+                all_tool_calls,
+                all_tool_outputs,
+                inputs[sent_inputs:],
+            )
+
         # Only include previous_response_id if it's not None
         request_params = {
             "model": model,
@@ -624,8 +921,22 @@ def execute_response_turn(
         }
         if previous_id is not None:
             request_params["previous_response_id"] = previous_id
-
-        resp = client.responses.create(**request_params)
+        request_params.update(sampling_params)
+
+        with (
+            tracer.span("api_call", api="responses", model=model),
+            profiler.phase("api call"),
+        ):
+            resp, shared = api_coalescer.call(
+                lambda: request_key("responses", request_params, str(client.base_url)),
+                lambda: send_model_request(client, "responses", request_params),
+            )
+        sent_inputs = len(inputs)
+        if budget is not None:
+            budget.record_usage(getattr(resp, "usage", None))
+        if not shared:
+            # A shared response's tokens count once in the run totals
+            usage_stats.record(getattr(resp, "usage", None))
         # pprint(resp)
 
         # If model gives text, output and finish
@@ -639,18 +950,30 @@ def execute_response_turn(
                         for block in content_blocks
                         if block.type == "output_text"
                     )
-                    return text, resp.id, all_tool_calls, all_tool_outputs
+                    return text, resp.id, all_tool_calls, all_tool_outputs, []
                 elif hasattr(item, "text"):  # Reasoning item
-                    return item.text, resp.id, all_tool_calls, all_tool_outputs
+                    return item.text, resp.id, all_tool_calls, all_tool_outputs, []
                 elif hasattr(item, "output_text"):  # Direct text output
-                    return item.output_text, resp.id, all_tool_calls, all_tool_outputs
+                    return (
+                        item.output_text,
+                        resp.id,
+                        all_tool_calls,
+                        all_tool_outputs,
+                        [],
+                    )
 
             # Fallback: try to get any text from the response
             for item in resp.output:
                 if hasattr(item, "text"):
-                    return item.text, resp.id, all_tool_calls, all_tool_outputs
-
-            return "No text response found", resp.id, all_tool_calls, all_tool_outputs
+                    return item.text, resp.id, all_tool_calls, all_tool_outputs, []
+
+            return (
+                "No text response found",
+                resp.id,
+                all_tool_calls,
+                all_tool_outputs,
+                [],
+            )
 
         # Otherwise run tools, feed outputs back
         tool_calls = [item for item in resp.output if item.type == "function_call"]
@@ -679,17 +1002,41 @@ def execute_response_turn(
                 }
             )
         previous_id = resp.id
+        if budget is not None:
+            budget.record_tool_round()
 
 
 def assistant_response_conversation(
     client, model, executor, user_messages, sample_id, log_filename
 ):
     previous_id = None
+    carried_inputs = []
+    budget = turn_limits.new_budget()
     messages = []  # Track full conversation history
     for turn_id, user_message in enumerate(user_messages, 1):
-        response, previous_id, tool_calls, tool_outputs = execute_response_turn(
-            client, model, executor, previous_id, user_message, sample_id, turn_id
-        )
+        if budget.interrupted():
+            # Cancelled or past a deadline: later turns are left unlogged
+            break
+        turn_start = time.perf_counter()
+        budget.start_turn()
+        with tracer.span("response_turn", sample_id=sample_id, turn_id=turn_id):
+            (
+                response,
+                previous_id,
+                tool_calls,
+                tool_outputs,
+                carried_inputs,
+            ) = execute_response_turn(
+                client,
+                model,
+                executor,
+                previous_id,
+                user_message,
+                sample_id,
+                turn_id,
+                budget,
+                carried_inputs,
+            )
 
         # Add user message
         messages.append({"role": "user", "content": user_message})
@@ -723,11 +1070,69 @@ def assistant_response_conversation(
             model,
             log_filename,
             executor.get_tool_schemas(),
+            time.perf_counter() - turn_start,
+            budget.status,
+            budget.truncation_reason,
+            budget.turn_usage,
+        )
+
+
+def add_system_prompt(messages, executor):
+    """Put the tool-describing system prompt first in the history if missing."""
+    if messages.first_role() != "system":
+        messages.insert(0, {"role": "system", "content": executor.get_system_prompt()})
+
+
+def build_chat_request(model, executor, messages, use_system_prompt):
+    """Build chat.completions request parameters for the current history."""
+    request_params = {
+        "model": model,
+        "messages": messages.wire_messages(),
+        "stream": False,
+    }
+    request_params.update(sampling_params)
+    if not use_system_prompt:
+        # Use tools parameter as before
+        request_params["tools"] = executor.get_chat_tool_schemas()
+    return request_params
+
+
+def create_chat_completion(client, model, request_params, debug=False):
+    """Send a chat.completions request through coalescing and the retry policy.
+
+    The response's tokens are added to the run totals unless it was shared
+    by a coalesced request, whose sender already counted them; callers still
+    charge them to their own conversation.
+    """
+    if debug:
+        pprint(request_params)
+    with (
+        tracer.span("api_call", api="chat.completions", model=model),
+        profiler.phase("api call"),
+    ):
+        resp, shared = api_coalescer.call(
+            lambda: request_key(
+                "chat.completions", request_params, str(client.base_url)
+            ),
+            lambda: send_model_request(client, "chat.completions", request_params),
         )
+    if debug:
+        pprint(resp)
+    if not shared:
+        usage_stats.record(resp.usage)
+    return resp
 
 
 def execute_chat_turn(
-    client, model, executor, messages, user_message, use_system_prompt, debug=False
+    client,
+    model,
+    executor,
+    messages,
+    user_message,
+    use_system_prompt,
+    debug=False,
+    budget=None,
+    first_message=None,
 ):
     # Add new user message to conversation
     messages.append({"role": "user", "content": user_message})
@@ -736,27 +1141,26 @@ def execute_chat_turn(
     all_tool_outputs = []
 
     while True:
-        # Prepare request parameters
-        request_params = {"model": model, "messages": messages, "stream": False}
+        # Stop without a final answer once a turn or conversation limit is hit
+        if budget is not None and budget.check():
+            return None, messages, all_tool_calls, all_tool_outputs
 
         if use_system_prompt:
             # Add system prompt with tool schemas instead of tools parameter
-            system_prompt = executor.get_system_prompt()
+            add_system_prompt(messages, executor)
 
-            # Add system message at the beginning if not already present
-            if not messages or messages[0]["role"] != "system":
-                messages.insert(0, {"role": "system", "content": system_prompt})
+        if first_message is not None:
+            # Reply already sampled for this branch (see --samples-per-turn)
+            assistant_message, first_message = first_message, None
         else:
-            # Use tools parameter as before
-            request_params["tools"] = executor.get_chat_tool_schemas()
-
-        # Make chat completion request
-        if debug:
-            pprint(request_params)
-        resp = client.chat.completions.create(**request_params)
-        if debug:
-            pprint(resp)
-        assistant_message = resp.choices[0].message
+            # Make chat completion request
+            request_params = build_chat_request(
+                model, executor, messages, use_system_prompt
+            )
+            resp = create_chat_completion(client, model, request_params, debug)
+            if budget is not None:
+                budget.record_usage(resp.usage)
+            assistant_message = resp.choices[0].message
         messages.append(assistant_message)
 
         # If no tool calls, return the response
@@ -764,41 +1168,63 @@ def execute_chat_turn(
             return assistant_message.content, messages, all_tool_calls, all_tool_outputs
 
         # Handle tool calls
-        tool_calls = assistant_message.tool_calls
-        for tool_call in tool_calls:
-            # Check if we need to use the older format for local APIs
-            if hasattr(tool_call, "call_id"):
-                # Older format
-                all_tool_calls.append(
-                    {
-                        "call_id": tool_call.call_id,
-                        "name": tool_call.tool_name,
-                        "arguments": tool_call.arguments,
-                    }
-                )
-            else:
-                # Standard OpenAI format
-                all_tool_calls.append(
-                    {
-                        "call_id": tool_call.id,
-                        "name": tool_call.function.name,
-                        "arguments": tool_call.function.arguments,
-                    }
-                )
+        run_chat_tool_calls(
+            executor,
+            assistant_message.tool_calls,
+            messages,
+            all_tool_calls,
+            all_tool_outputs,
+        )
+        if budget is not None:
+            budget.record_tool_round()
 
-        tool_outputs = executor.execute(tool_calls)
-        for tool_output in tool_outputs:
-            all_tool_outputs.append(
-                {"call_id": tool_output["call_id"], "output": tool_output["output"]}
+
+def run_chat_tool_calls(
+    executor, tool_calls, messages, all_tool_calls, all_tool_outputs
+):
+    """Execute an assistant message's tool calls and append the tool messages.
+
+    Args:
+        executor: ToolExecutor for the conversation
+        tool_calls: Tool calls from the assistant message
+        messages: Conversation history to append tool messages to
+        all_tool_calls: List collecting the turn's tool calls for logging
+        all_tool_outputs: List collecting the turn's tool outputs for logging
+    """
+    for tool_call in tool_calls:
+        # Check if we need to use the older format for local APIs
+        if hasattr(tool_call, "call_id"):
+            # Older format
+            all_tool_calls.append(
+                {
+                    "call_id": tool_call.call_id,
+                    "name": tool_call.tool_name,
+                    "arguments": tool_call.arguments,
+                }
             )
-            messages.append(
+        else:
+            # Standard OpenAI format
+            all_tool_calls.append(
                 {
-                    "role": "tool",
-                    "tool_call_id": tool_output["call_id"],
-                    "content": str(tool_output["output"]),
+                    "call_id": tool_call.id,
+                    "name": tool_call.function.name,
+                    "arguments": tool_call.function.arguments,
                 }
             )
 
+    tool_outputs = executor.execute(tool_calls)
+    for tool_output in tool_outputs:
+        all_tool_outputs.append(
+            {"call_id": tool_output["call_id"], "output": tool_output["output"]}
+        )
+        messages.append(
+            {
+                "role": "tool",
+                "tool_call_id": tool_output["call_id"],
+                "content": str(tool_output["output"]),
+            }
+        )
+
 
 def assistant_chat_conversation(
     client,
@@ -810,84 +1236,349 @@ def assistant_chat_conversation(
     log_filename,
     console_log_filename,
     debug=False,
+    samples_per_turn=1,
 ):
-    messages = []  # Track full conversation history
-    for turn_id, user_message in enumerate(user_messages, 1):
-        response, updated_messages, tool_calls, tool_outputs = execute_chat_turn(
-            client, model, executor, messages, user_message, use_system_prompt, debug
+    if samples_per_turn == 1 or not user_messages:
+        run_chat_branch(
+            client,
+            model,
+            executor,
+            user_messages,
+            sample_id,
+            use_system_prompt,
+            log_filename,
+            console_log_filename,
+            debug,
+        )
+        return
+
+    if turn_limits.new_budget().check():
+        # Cancelled or out of budget before the shared request: each branch
+        # stops (or logs its truncated first turn) on its own
+        for choice_index in range(samples_per_turn):
+            run_chat_branch(
+                client,
+                model,
+                executor,
+                user_messages,
+                sample_id,
+                use_system_prompt,
+                log_filename,
+                console_log_filename,
+                debug,
+                choice_index=choice_index,
+            )
+        return
+
+    # Sample the opening reply K times in one request (n=K). Each choice then
+    # continues as its own branch, so the shared prefix is only paid for once.
+    request_start = time.perf_counter()
+    prefix = ConversationState()
+    prefix.append({"role": "user", "content": user_messages[0]})
+    if use_system_prompt:
+        add_system_prompt(prefix, executor)
+    request_params = build_chat_request(model, executor, prefix, use_system_prompt)
+    request_params["n"] = samples_per_turn
+    resp = create_chat_completion(client, model, request_params, debug)
+    request_seconds = time.perf_counter() - request_start
+    choices = sorted(resp.choices, key=lambda choice: choice.index)
+    if len(choices) < samples_per_turn:
+        log_message(
+            f"Endpoint returned {len(choices)} of {samples_per_turn} requested choices",
+            console_log_filename,
+            prefix="WARNING",
         )
 
-        # Update our messages list with the returned messages
-        messages = updated_messages
+    for choice_index, choice in enumerate(choices):
+        run_chat_branch(
+            client,
+            model,
+            executor,
+            user_messages,
+            sample_id,
+            use_system_prompt,
+            log_filename,
+            console_log_filename,
+            debug,
+            first_message=choice.message,
+            # The shared request's tokens are counted once, in branch 0
+            first_usage=resp.usage if choice_index == 0 else None,
+            first_seconds=request_seconds,
+            choice_index=choice_index,
+        )
 
-        # Log the messages to console log file
-        debug_messages = []
-        debug_messages.append(f"Turn {turn_id} has {len(messages)} messages")
-        for i, msg in enumerate(messages):
-            if hasattr(msg, "model_dump"):
-                msg_dict = msg.model_dump()
-            else:
-                msg_dict = msg
-            role = msg_dict.get("role", "unknown")
-            if "content" in msg_dict and msg_dict.get("content"):
-                debug_messages.append(
-                    f"  {i}: {role} - {str(msg_dict.get('content', 'no content'))[:50]}..."
-                )
-            elif "tool_calls" in msg_dict and msg_dict.get("tool_calls"):
-                tool_calls = [
-                    fn.get("function", {}) for fn in msg_dict.get("tool_calls", [])
-                ]
-                tool_calls_str = ",".join(
-                    [
-                        f"{tc.get('name', 'unknown')}({tc.get('arguments', {})})"
-                        for tc in tool_calls
-                    ]
-                )
-                debug_messages.append(f"  {i}: {role} - tool_calls: {tool_calls_str}")
-            else:
-                debug_messages.append(f"  {i}: {role} - no content")
 
-        log_message("\n".join(debug_messages), console_log_filename, prefix="DEBUG")
+def run_chat_branch(
+    client,
+    model,
+    executor,
+    user_messages,
+    sample_id,
+    use_system_prompt,
+    log_filename,
+    console_log_filename,
+    debug=False,
+    first_message=None,
+    first_usage=None,
+    first_seconds=0.0,
+    choice_index=None,
+):
+    """Run and log every turn of one chat conversation branch.
+
+    Args:
+        first_message: Already sampled first assistant reply of the branch
+        first_usage: Token usage of the request that sampled first_message
+        first_seconds: Wall time of that request, counted in turn 1's duration
+        choice_index: Index of the branch's choice, logged when sampling
+            several replies per conversation
+    """
+    messages = ConversationState()  # Track full conversation history
+    budget = turn_limits.new_budget()
+    for turn_id, user_message in enumerate(user_messages, 1):
+        if budget.interrupted():
+            # Cancelled or past a deadline: later turns are left unlogged
+            break
+        turn_start = time.perf_counter()
+        if turn_id == 1:
+            turn_start -= first_seconds
+        budget.start_turn()
+        if turn_id == 1 and first_usage is not None:
+            budget.record_usage(first_usage)
+        with tracer.span("chat_turn", sample_id=sample_id, turn_id=turn_id):
+            response, updated_messages, tool_calls, tool_outputs = execute_chat_turn(
+                client,
+                model,
+                executor,
+                messages,
+                user_message,
+                use_system_prompt,
+                debug,
+                budget,
+                first_message if turn_id == 1 else None,
+            )
 
-        # Convert all messages to dicts for logging (handle Pydantic objects)
-        messages_for_log = []
-        for msg in messages:
-            if hasattr(msg, "model_dump"):
-                messages_for_log.append(msg.model_dump())
-            else:
-                messages_for_log.append(copy.deepcopy(msg))
-
-        # Ensure tool responses are in the messages array for logging
-        if tool_outputs:
-            tool_response_ids = set()
-            for msg in messages_for_log:
-                if msg.get("role") == "tool":
-                    tool_response_ids.add(msg.get("tool_call_id"))
-            for tool_output in tool_outputs:
-                if tool_output["call_id"] not in tool_response_ids:
-                    messages_for_log.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": tool_output["call_id"],
-                            "content": str(tool_output["output"]),
-                        }
-                    )
+        # Update our messages list with the returned messages
+        messages = updated_messages
 
-        thread_safe_log_turn(
+        log_chat_turn(
             sample_id,
             turn_id,
             user_message,
+            messages,
             tool_calls,
             tool_outputs,
             response,
-            messages_for_log,
             model,
+            executor,
             log_filename,
-            executor.get_chat_tool_schemas(),
+            console_log_filename,
+            time.perf_counter() - turn_start,
+            budget.status,
+            budget.truncation_reason,
+            budget.turn_usage,
+            choice_index,
         )
 
 
-def process_single_conversation(conversation_data):
+def log_chat_turn(
+    sample_id,
+    turn_id,
+    user_message,
+    messages,
+    tool_calls,
+    tool_outputs,
+    response,
+    model,
+    executor,
+    log_filename,
+    console_log_filename,
+    duration_seconds=None,
+    status="completed",
+    truncation_reason=None,
+    usage=None,
+    choice_index=None,
+):
+    """Write a finished chat turn to the console log and the JSONL log.
+
+    messages is the conversation's ConversationState, whose cached message
+    encodings are reused for both logs.
+    """
+    # Ensure tool responses are in the messages array for logging
+    for tool_output in tool_outputs:
+        if not messages.has_tool_response(tool_output["call_id"]):
+            messages.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": tool_output["call_id"],
+                    "content": str(tool_output["output"]),
+                }
+            )
+
+    # Log the messages to console log file
+    debug_messages = [f"Turn {turn_id} has {len(messages)} messages"]
+    debug_messages.extend(messages.debug_lines())
+    log_message("\n".join(debug_messages), console_log_filename, prefix="DEBUG")
+    if truncation_reason is not None:
+        log_message(
+            f"Turn {turn_id} of sample {sample_id} truncated: {truncation_reason}",
+            console_log_filename,
+            prefix="WARNING",
+        )
+
+    thread_safe_log_turn(
+        sample_id,
+        turn_id,
+        user_message,
+        tool_calls,
+        tool_outputs,
+        response,
+        messages,
+        model,
+        log_filename,
+        executor.get_chat_tool_schemas(),
+        duration_seconds,
+        status,
+        truncation_reason,
+        usage,
+        choice_index,
+    )
+
+
+def prepare_conversation_tools(
+    conversation,
+    sample_id,
+    model,
+    client,
+    executor,
+    base_url,
+    run_options,
+    console_log_filename,
+):
+    """Build the tool executor for a conversation, creating file search if needed.
+
+    Returns:
+        Tuple of (conversation executor, dynamic file_search function or None),
+        or None if the file search function could not be created
+    """
+    # Get tools for this conversation, default to all tools if not specified
+    conversation_tools = conversation.get("tools", [])
+    file_paths = conversation.get("file_paths", [])
+
+    # Handle file_search tool specially if present
+    dynamic_file_search_func = None
+    if needs_file_search(conversation):
+        prefetched = (
+            resource_prefetcher.take(sample_id)
+            if resource_prefetcher is not None
+            else None
+        )
+        log_message(
+            f"{'Using prefetched' if prefetched else 'Creating'} file search function with files: {file_paths}",
+            console_log_filename,
+        )
+        try:
+            if prefetched is not None:
+                dynamic_file_search_func = prefetched.result()
+            else:
+                dynamic_file_search_func = create_conversation_file_search(
+                    conversation, client, run_options
+                )
+            log_message(
+                "File search function created successfully",
+                console_log_filename,
+            )
+        except Exception as e:
+            error_msg = (
+                f"\nERROR: Failed to create file search function for conversation '{conversation['name']}'\n"
+                f"Cause: {e}\n"
+                f"\nThis conversation requires file search functionality, but the API endpoint\n"
+                f"at {base_url} does not support OpenAI vector stores.\n"
+                f"\nTo fix this:\n"
+                f"1. Use the real OpenAI API (https://api.openai.com/v1) with vector stores support\n"
+                f"2. Remove the 'file_search' tool and 'file_paths' from this conversation\n"
+                f"3. Skip this conversation using --samples to exclude sample {sample_id}\n"
+                f"4. Search the files locally with --file-search-backend local\n"
+                f"\nExample: ./generate.py sample_conversations.yaml {model} --samples 1,2,5-10"
+            )
+            print(error_msg)
+            return None
+
+    if conversation_tools:
+        # Create a filtered executor with only the specified tools
+        conversation_executor = executor.create_filtered_executor(conversation_tools)
+
+        # Replace the placeholder file_search function with the dynamic one if created
+        if dynamic_file_search_func and "file_search" in conversation_tools:
+            conversation_executor.register("file_search", dynamic_file_search_func)
+
+        log_message(f"Using tools: {conversation_tools}", console_log_filename)
+    else:
+        # Use all available tools
+        conversation_executor = executor
+        log_message("Using all available tools", console_log_filename)
+
+    return conversation_executor, dynamic_file_search_func
+
+
+def needs_file_search(conversation):
+    """Return True if the conversation searches its own files."""
+    return "file_search" in conversation.get("tools", []) and bool(
+        conversation.get("file_paths")
+    )
+
+
+def create_conversation_file_search(conversation, client, run_options):
+    """Create the file search function over a conversation's files."""
+    file_paths = conversation["file_paths"]
+    with tracer.span("file_search_setup", files=len(file_paths)):
+        if run_options["file_search_backend"] == "local":
+            return create_local_file_search_function(
+                file_paths, run_options["file_search_index_dir"]
+            )
+        return create_file_search_function(
+            client, file_paths, run_options["vector_store_registry"]
+        )
+
+
+def file_search_prefetch_key(conversation_data):
+    """Return the sample ID of a conversation with file search to prefetch, else None."""
+    conversation, sample_id = conversation_data[:2]
+    return sample_id if needs_file_search(conversation) else None
+
+
+def prefetch_file_search(conversation_data):
+    """Create a queued conversation's file search function ahead of its turn."""
+    conversation, client, run_options = (
+        conversation_data[0],
+        conversation_data[8],
+        conversation_data[11],
+    )
+    return create_conversation_file_search(conversation, client, run_options)
+
+
+def release_conversation_tools(dynamic_file_search_func):
+    """Clean up the file search function's vector store if it was created."""
+    if dynamic_file_search_func:
+        print("Cleaning up file search resources...")
+        try:
+            with tracer.span("file_search_cleanup"):
+                cleanup_file_search_function(dynamic_file_search_func)
+        except Exception as e:
+            print(f"Warning: Failed to cleanup file search resources: {e}")
+
+
+def dispatch_stopped():
+    """Return True once no further conversation should be started.
+
+    That is when the run was cancelled or passed its deadline, or the live
+    scorer stopped it.
+    """
+    return turn_limits.run_stopped() is not None or (
+        live_scorer is not None and live_scorer.stopped
+    )
+
+
+def process_single_conversation(conversation_data):
     """Process a single conversation - safe for parallel execution."""
     (
         conversation,
@@ -901,115 +1592,415 @@ def process_single_conversation(conversation_data):
         client,
         executor,
         base_url,
+        run_options,
     ) = conversation_data
 
-    try:
-        log_message(
-            f"\n=== Running conversation: {conversation['name']} (sample_id={sample_id}) ===\n",
-            console_log_filename,
-        )
-
-        # Get tools for this conversation, default to all tools if not specified
-        conversation_tools = conversation.get("tools", [])
-        file_paths = conversation.get("file_paths", [])
-
-        # Handle file_search tool specially if present
-        dynamic_file_search_func = None
-        if "file_search" in conversation_tools and file_paths:
+    if dispatch_stopped():
+        if resource_prefetcher is not None:
+            resource_prefetcher.discard(sample_id)
+        return None
+
+    run_metrics.conversation_started()
+    with (
+        tracer.span(
+            "conversation", sample_id=sample_id, conversation=conversation["name"]
+        ),
+        profiler.phase("request loop"),
+        # Every turn goes to the same endpoint so its prefix cache is reused
+        endpoint_pool.session() as endpoint,
+    ):
+        try:
             log_message(
-                f"Creating file search function with files: {file_paths}",
+                f"\n=== Running conversation: {conversation['name']} (sample_id={sample_id}) ===\n",
                 console_log_filename,
             )
-            try:
-                dynamic_file_search_func = create_file_search_function(
-                    client, file_paths
-                )
-                log_message(
-                    "File search function created successfully", console_log_filename
-                )
-            except Exception as e:
-                error_msg = (
-                    f"\nERROR: Failed to create file search function for conversation '{conversation['name']}'\n"
-                    f"Cause: {e}\n"
-                    f"\nThis conversation requires file search functionality, but the API endpoint\n"
-                    f"at {base_url} does not support OpenAI vector stores.\n"
-                    f"\nTo fix this:\n"
-                    f"1. Use the real OpenAI API (https://api.openai.com/v1) with vector stores support\n"
-                    f"2. Remove the 'file_search' tool and 'file_paths' from this conversation\n"
-                    f"3. Skip this conversation using --samples to exclude sample {sample_id}\n"
-                    f"\nExample: ./generate.py sample_conversations.yaml {model} --samples 1,2,5-10"
-                )
-                print(error_msg)
+            if len(endpoint_pool.endpoints) > 1:
+                log_message(f"Using endpoint {endpoint.base_url}", console_log_filename)
+
+            prepared = prepare_conversation_tools(
+                conversation,
+                sample_id,
+                model,
+                client,
+                executor,
+                base_url,
+                run_options,
+                console_log_filename,
+            )
+            if prepared is None:
                 return None
+            conversation_executor, dynamic_file_search_func = prepared
 
-        if conversation_tools:
-            # Create a filtered executor with only the specified tools
-            conversation_executor = executor.create_filtered_executor(
-                conversation_tools
-            )
+            try:
+                if mode == "responses":
+                    assistant_response_conversation(
+                        endpoint.client,
+                        model,
+                        conversation_executor,
+                        conversation["messages"],
+                        sample_id,
+                        log_filename,
+                    )
+                else:
+                    assistant_chat_conversation(
+                        endpoint.client,
+                        model,
+                        conversation_executor,
+                        conversation["messages"],
+                        sample_id,
+                        use_system_prompt,
+                        log_filename,
+                        console_log_filename,
+                        debug,
+                        run_options["samples_per_turn"],
+                    )
+                return f"Completed conversation {sample_id}: {conversation['name']}"
+            finally:
+                release_conversation_tools(dynamic_file_search_func)
 
-            # Replace the placeholder file_search function with the dynamic one if created
-            if dynamic_file_search_func and "file_search" in conversation_tools:
-                conversation_executor.register("file_search", dynamic_file_search_func)
+        except Exception as e:
+            error_msg = f"Error processing conversation {sample_id} ({conversation['name']}): {e}"
+            print(error_msg)
+            return error_msg
+        finally:
+            run_metrics.conversation_finished()
 
-            log_message(f"Using tools: {conversation_tools}", console_log_filename)
-        else:
-            # Use all available tools
-            conversation_executor = executor
-            log_message("Using all available tools", console_log_filename)
 
-        try:
-            if mode == "responses":
-                assistant_response_conversation(
-                    client,
-                    model,
-                    conversation_executor,
-                    conversation["messages"],
-                    sample_id,
-                    log_filename,
-                )
-            else:
-                assistant_chat_conversation(
-                    client,
-                    model,
-                    conversation_executor,
-                    conversation["messages"],
-                    sample_id,
-                    use_system_prompt,
-                    log_filename,
-                    console_log_filename,
-                    debug,
-                )
-            return f"Completed conversation {sample_id}: {conversation['name']}"
-        finally:
-            # Clean up the file search function's vector store if it was created
-            if dynamic_file_search_func:
-                print("Cleaning up file search resources...")
+# Batch API limits and the statuses after which a batch will not progress
+BATCH_MAX_REQUESTS = 50000
+BATCH_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def run_chat_batch(client, requests, poll_interval):
+    """Run chat completion requests as one Batch API job and wait for it.
+
+    Args:
+        client: OpenAI client
+        requests: Dict mapping custom_id to a chat.completions request body
+        poll_interval: Seconds to wait between batch status checks
+
+    Returns:
+        Dict mapping custom_id to a ChatCompletion, or to an error message
+        for requests that did not succeed. If the run is cancelled or passes
+        its deadline while waiting, the batch is cancelled and every request
+        gets an error message.
+    """
+    batch_input = "".join(
+        json.dumps(
+            {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }
+        )
+        + "\n"
+        for custom_id, body in requests.items()
+    )
+
+    with tracer.span("batch_job", requests=len(requests)):
+        input_file = client.files.create(
+            file=("batch_input.jsonl", batch_input.encode()), purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        stop_reason = None
+        while batch.status not in BATCH_FINAL_STATUSES:
+            stop_reason = turn_limits.run_stopped()
+            if stop_reason is not None:
+                # Don't wait out the completion window once the run is stopping
                 try:
-                    cleanup_file_search_function(dynamic_file_search_func)
+                    client.batches.cancel(batch.id)
                 except Exception as e:
-                    print(f"Warning: Failed to cleanup file search resources: {e}")
+                    print(f"Warning: Failed to cancel batch {batch.id}: {e}")
+                break
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+
+        results = {}
+        output_files = (
+            (batch.output_file_id, batch.error_file_id) if stop_reason is None else ()
+        )
+        for file_id in output_files:
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if item.get("error"):
+                    results[item["custom_id"]] = item["error"].get("message", "")
+                elif response.get("status_code") != 200:
+                    error = (response.get("body") or {}).get("error") or {}
+                    results[item["custom_id"]] = (
+                        f"HTTP {response.get('status_code')}: {error.get('message', '')}"
+                    )
+                else:
+                    results[item["custom_id"]] = ChatCompletion.model_validate(
+                        response["body"]
+                    )
 
+    try:
+        client.files.delete(input_file.id)
     except Exception as e:
-        error_msg = (
-            f"Error processing conversation {sample_id} ({conversation['name']}): {e}"
+        print(f"Warning: Failed to delete batch input file: {e}")
+
+    for custom_id in requests:
+        results.setdefault(
+            custom_id,
+            f"Batch {batch.id} cancelled ({stop_reason})"
+            if stop_reason is not None
+            else f"Batch {batch.id} ended with status {batch.status}",
+        )
+    return results
+
+
+class BatchConversation:
+    """A chat conversation advanced one Batch API round at a time.
+
+    Each round sends at most one chat completion request for the
+    conversation. Replies with tool calls are answered locally and resent in
+    the next round; final replies are logged like assistant_chat_conversation
+    does and the next user message is queued.
+    """
+
+    def __init__(self, conversation_data, executor, dynamic_file_search_func):
+        (
+            self.conversation,
+            self.sample_id,
+            _,
+            self.model,
+            _,
+            self.log_filename,
+            self.console_log_filename,
+            self.debug,
+            _,
+            _,
+            _,
+            _,
+        ) = conversation_data
+        self.executor = executor
+        self.dynamic_file_search_func = dynamic_file_search_func
+        self.user_messages = list(self.conversation["messages"])
+        self.messages = ConversationState()
+        self.budget = turn_limits.new_budget()
+        self.turn_id = 0
+        self.round = 0
+        self.finished = False
+        self._start_turn()
+
+    def _start_turn(self):
+        if self.turn_id == len(self.user_messages) or self.budget.interrupted():
+            # Cancelled or past a deadline: later turns are left unlogged
+            self.finished = True
+            return
+        self.user_message = self.user_messages[self.turn_id]
+        self.turn_id += 1
+        self.round = 0
+        self.tool_calls = []
+        self.tool_outputs = []
+        self.turn_start = time.perf_counter()
+        self.budget.start_turn()
+        self.messages.append({"role": "user", "content": self.user_message})
+        # A conversation out of tokens logs its remaining turns as truncated
+        if self.budget.check():
+            self._finish_turn(None)
+
+    def _finish_turn(self, response):
+        log_chat_turn(
+            self.sample_id,
+            self.turn_id,
+            self.user_message,
+            self.messages,
+            self.tool_calls,
+            self.tool_outputs,
+            response,
+            self.model,
+            self.executor,
+            self.log_filename,
+            self.console_log_filename,
+            time.perf_counter() - self.turn_start,
+            self.budget.status,
+            self.budget.truncation_reason,
+            self.budget.turn_usage,
+        )
+        self._start_turn()
+
+    def stop(self):
+        """Log the current turn as truncated by the run stopping, and finish."""
+        self.budget.check()
+        self._finish_turn(None)
+
+    @property
+    def custom_id(self) -> str:
+        return f"{self.sample_id}-{self.turn_id}-{self.round}"
+
+    def request_body(self) -> Dict[str, Any]:
+        """Build the chat completion request for the current round."""
+        request_params = {
+            "model": self.model,
+            "messages": self.messages.wire_messages(),
+            "tools": self.executor.get_chat_tool_schemas(),
+            **sampling_params,
+        }
+        if self.debug:
+            pprint(request_params)
+        return request_params
+
+    def handle_response(self, resp):
+        """Apply a round's ChatCompletion: run its tool calls or finish the turn."""
+        if self.debug:
+            pprint(resp)
+        self.budget.record_usage(resp.usage)
+        usage_stats.record(resp.usage)
+        assistant_message = resp.choices[0].message
+        self.messages.append(assistant_message)
+
+        if not assistant_message.tool_calls:
+            self._finish_turn(assistant_message.content)
+            return
+
+        run_chat_tool_calls(
+            self.executor,
+            assistant_message.tool_calls,
+            self.messages,
+            self.tool_calls,
+            self.tool_outputs,
         )
-        print(error_msg)
-        return error_msg
+        self.budget.record_tool_round()
+        if self.budget.check():
+            self._finish_turn(None)
+        else:
+            self.round += 1
 
 
-def load_conversations_from_yaml(filename):
-    """Load conversation samples from YAML file."""
-    with open(filename, "r") as f:
-        data = yaml.safe_load(f)
-    return data["conversations"]
+def run_batch_conversations(conversation_data_list, client, poll_interval):
+    """Process conversations through the Batch API.
+
+    All active conversations are advanced together: each round submits one
+    batch (split at BATCH_MAX_REQUESTS) holding the next request of every
+    conversation, then runs the returned tool calls locally before the
+    follow-up round.
+
+    Args:
+        conversation_data_list: Tuples as passed to process_single_conversation
+        client: OpenAI client used to submit the batches
+        poll_interval: Seconds to wait between batch status checks
+
+    Returns:
+        List of per-conversation result messages
+    """
+    results = []
+    active = []
+    for conversation_data in conversation_data_list:
+        (
+            conversation,
+            sample_id,
+            _,
+            model,
+            _,
+            _,
+            console_log_filename,
+            _,
+            _,
+            executor,
+            base_url,
+            run_options,
+        ) = conversation_data
+        log_message(
+            f"\n=== Running conversation: {conversation['name']} (sample_id={sample_id}) ===\n",
+            console_log_filename,
+        )
+        prepared = prepare_conversation_tools(
+            conversation,
+            sample_id,
+            model,
+            client,
+            executor,
+            base_url,
+            run_options,
+            console_log_filename,
+        )
+        if prepared is None:
+            continue
+        state = BatchConversation(conversation_data, *prepared)
+        if state.finished:
+            release_conversation_tools(state.dynamic_file_search_func)
+            results.append(
+                f"Completed conversation {sample_id}: {conversation['name']}"
+            )
+        else:
+            active.append(state)
+
+    batch_round = 0
+    while active:
+        batch_round += 1
+        print(f"Batch round {batch_round}: {len(active)} requests")
+        with tracer.span("batch_round", round=batch_round, requests=len(active)):
+            requests = {state.custom_id: state.request_body() for state in active}
+            responses = {}
+            custom_ids = list(requests)
+            for start in range(0, len(custom_ids), BATCH_MAX_REQUESTS):
+                if turn_limits.run_stopped() is not None:
+                    break
+                chunk = custom_ids[start : start + BATCH_MAX_REQUESTS]
+                try:
+                    responses.update(
+                        run_chat_batch(
+                            client,
+                            {custom_id: requests[custom_id] for custom_id in chunk},
+                            poll_interval,
+                        )
+                    )
+                except Exception as e:
+                    print(f"Error running batch: {e}")
+                    responses.update({custom_id: str(e) for custom_id in chunk})
+
+            still_active = []
+            stopped = turn_limits.run_stopped() is not None
+            for state in active:
+                name = state.conversation["name"]
+                response = responses.get(state.custom_id)
+                if stopped and not isinstance(response, ChatCompletion):
+                    # Its request was cancelled or never sent; the unfinished
+                    # summary lists the conversation for a rerun
+                    state.stop()
+                    release_conversation_tools(state.dynamic_file_search_func)
+                    results.append(
+                        f"Stopped conversation {state.sample_id}: {name} "
+                        f"({turn_limits.run_stopped()})"
+                    )
+                    continue
+                try:
+                    if isinstance(response, str):
+                        raise RuntimeError(response)
+                    state.handle_response(response)
+                except Exception as e:
+                    error_msg = (
+                        f"Error processing conversation {state.sample_id} ({name}): {e}"
+                    )
+                    print(error_msg)
+                    results.append(error_msg)
+                    release_conversation_tools(state.dynamic_file_search_func)
+                    continue
+                if state.finished:
+                    release_conversation_tools(state.dynamic_file_search_func)
+                    results.append(f"Completed conversation {state.sample_id}: {name}")
+                else:
+                    still_active.append(state)
+            active = still_active
+
+    return results
 
 
 # Get all functions from sample_tools module
 tools = [
     obj for name, obj in inspect.getmembers(sample_tools) if inspect.isfunction(obj)
 ]
-executor = ToolExecutor(*tools)
 
 # Set up argument parser
 parser = argparse.ArgumentParser(
@@ -1021,10 +2012,16 @@ parser.add_argument(
 parser.add_argument("model", help="Model name to use for evaluation")
 parser.add_argument(
     "--mode",
-    choices=["responses", "chat_tools", "system_prompt"],
+    choices=["responses", "chat_tools", "system_prompt", "batch"],
     default="chat_tools",
     help="API mode to use (default: chat_tools)",
 )
+parser.add_argument(
+    "--batch-poll-interval",
+    type=float,
+    default=30,
+    help="Seconds between Batch API status checks in batch mode (default: 30)",
+)
 parser.add_argument(
     "--samples",
     help='Comma-separated list of sample IDs to run (e.g., "1,3,5,6,10"). If not specified, runs all samples.',
@@ -1044,6 +2041,286 @@ parser.add_argument(
     default=1,
     help="Number of parallel workers for processing conversations (default: 1, sequential)",
 )
+parser.add_argument(
+    "--temperature",
+    type=float,
+    help="Sampling temperature sent with every request (default: the endpoint's default)",
+)
+parser.add_argument(
+    "--samples-per-turn",
+    type=int,
+    default=1,
+    help="Sample K replies to each conversation's first turn in one request (n=K) and continue each as its own branch, logged with a choice_index (chat_tools and system_prompt modes, default: 1)",
+)
+parser.add_argument(
+    "--coalesce-requests",
+    choices=["auto", "on", "off"],
+    default="auto",
+    help="Share one in-flight API call among identical concurrent requests; auto enables it at --temperature 0 (default: auto)",
+)
+parser.add_argument(
+    "--max-attempts",
+    type=int,
+    default=4,
+    help="Attempts per model request before giving up on the conversation (default: 4, 1 disables retries)",
+)
+parser.add_argument(
+    "--retry-on",
+    default=",".join(ERROR_CLASSES),
+    help=f"Comma-separated error classes to retry (default: {','.join(ERROR_CLASSES)})",
+)
+parser.add_argument(
+    "--retry-base-delay",
+    type=float,
+    default=1.0,
+    help="Initial backoff in seconds; doubles per attempt, with full jitter (default: 1.0)",
+)
+parser.add_argument(
+    "--retry-max-delay",
+    type=float,
+    default=30.0,
+    help="Maximum backoff in seconds between attempts (default: 30)",
+)
+parser.add_argument(
+    "--attempt-timeout",
+    type=float,
+    help="Seconds before a single model request attempt times out and is retried",
+)
+parser.add_argument(
+    "--hedge",
+    action="store_true",
+    help="Send a duplicate of any model request still running after the observed --hedge-percentile latency and use the first answer",
+)
+parser.add_argument(
+    "--hedge-percentile",
+    type=float,
+    default=95,
+    help="Latency percentile after which a request is hedged (default: 95)",
+)
+parser.add_argument(
+    "--golden",
+    help="Golden conversation log to score each turn against as it is logged; the running accuracy is shown on the progress bar",
+)
+parser.add_argument(
+    "--abort-below",
+    type=float,
+    help="With --golden, stop starting new conversations once accuracy (0-1) falls below this value",
+)
+parser.add_argument(
+    "--abort-min-turns",
+    type=int,
+    default=10,
+    help="Turns scored against --golden before --abort-below applies (default: 10)",
+)
+parser.add_argument(
+    "--target-ci-width",
+    type=float,
+    help="With --golden, run conversations in stratified random order and stop starting new ones once the 95%% confidence interval on accuracy is narrower than this (0-1)",
+)
+parser.add_argument(
+    "--max-tool-rounds",
+    type=int,
+    default=20,
+    help="Tool-call rounds allowed per turn before it is logged as truncated (default: 20)",
+)
+parser.add_argument(
+    "--max-conversation-tokens",
+    type=int,
+    help="Total tokens a conversation may use; once reached, its remaining requests are skipped and turns logged as truncated",
+)
+parser.add_argument(
+    "--max-turn-seconds",
+    type=float,
+    help="Wall time per turn after which no further request is sent and the turn is logged as truncated",
+)
+parser.add_argument(
+    "--conversation-deadline",
+    type=float,
+    help="Wall time per conversation after which it stops; the interrupted turn is logged as truncated and later turns are not run",
+)
+parser.add_argument(
+    "--run-deadline",
+    type=float,
+    help="Wall time for the whole run after which no conversation starts or sends further requests; unfinished samples are written to a summary for a rerun",
+)
+parser.add_argument(
+    "--endpoints",
+    help="YAML file with a pool of weighted endpoint/API key pairs to balance conversations across (default: BASE_URL and OPENAI_API_KEY)",
+)
+parser.add_argument(
+    "--endpoint-failures",
+    type=int,
+    default=3,
+    help="Consecutive failed requests after which an endpoint is ejected from the pool (default: 3)",
+)
+parser.add_argument(
+    "--endpoint-cooldown",
+    type=float,
+    default=30.0,
+    help="Seconds an ejected endpoint gets no new conversations, doubling on each ejection up to 300 (default: 30)",
+)
+parser.add_argument(
+    "--prefetch",
+    type=int,
+    default=2,
+    help="Queued conversations whose file search resources are prepared in the background ahead of their turn (default: 2, 0 disables; not used in batch mode)",
+)
+parser.add_argument(
+    "--schedule",
+    choices=["auto", "fifo", "longest-first", "stratified"],
+    default="auto",
+    help="Order in which conversations are dispatched to workers; auto is stratified with --target-ci-width, longest-first among the next 500 conversations when --workers > 1, else fifo (default: auto)",
+)
+parser.add_argument(
+    "--stratify-by",
+    choices=["tools", "turns"],
+    default="tools",
+    help="Strata of the stratified schedule: the conversation's tool set or its turn count (default: tools)",
+)
+parser.add_argument(
+    "--seed",
+    type=int,
+    help="Random seed of the stratified schedule (default: a different order every run)",
+)
+parser.add_argument(
+    "--history",
+    nargs="*",
+    help="Earlier output logs whose per-sample timings inform longest-first scheduling (default: the output log, if it exists)",
+)
+parser.add_argument(
+    "--tool-workers",
+    type=int,
+    default=4,
+    help="Number of threads used to run the tool calls of one assistant message concurrently (default: 4, 1 runs them in order)",
+)
+parser.add_argument(
+    "--tool-concurrency",
+    help='Per-tool limits on concurrent executions across all conversations (e.g., "file_search=2,get_weather=8")',
+)
+parser.add_argument(
+    "--tool-timeout",
+    type=float,
+    help="Seconds to wait for a single tool call before reporting it as timed out; each call then runs on a thread of its own",
+)
+parser.add_argument(
+    "--tool-cache-size",
+    type=int,
+    default=4096,
+    help="Maximum number of memoized tool results kept in memory (default: 4096, 0 disables the cache)",
+)
+parser.add_argument(
+    "--tool-cache-file",
+    help="SQLite file used to persist memoized tool results across runs",
+)
+parser.add_argument(
+    "--file-search-backend",
+    choices=["openai", "local"],
+    default="openai",
+    help="Backend for the file_search tool: OpenAI vector stores or a local BM25 index that works with any endpoint (default: openai)",
+)
+parser.add_argument(
+    "--file-search-index-dir",
+    default=".file_search_index",
+    help="Directory where local file_search indexes are persisted (default: .file_search_index)",
+)
+parser.add_argument(
+    "--vector-store-registry",
+    default=".file_search_stores.json",
+    help="File recording vector stores reused across conversations and runs, keyed by file contents (default: .file_search_stores.json)",
+)
+parser.add_argument(
+    "--collect-orphan-vector-stores",
+    action="store_true",
+    help="Delete, in the background, tagged vector stores missing from the registry and idle for over an hour; only safe when no other machine shares the account",
+)
+parser.add_argument(
+    "--no-reuse-vector-stores",
+    action="store_true",
+    help="Create a new vector store for every file_search conversation and delete it afterwards",
+)
+parser.add_argument(
+    "--plan",
+    action="store_true",
+    help="Forecast requests, tokens, cost and wall time for the selected conversations without calling any model, then exit",
+)
+parser.add_argument(
+    "--plan-request-seconds",
+    type=float,
+    default=2.0,
+    help="Assumed latency of one model request for --plan (default: 2.0)",
+)
+parser.add_argument(
+    "--plan-rpm",
+    type=float,
+    help="Requests-per-minute limit of the endpoint, for --plan",
+)
+parser.add_argument(
+    "--plan-tpm",
+    type=float,
+    help="Tokens-per-minute limit of the endpoint, for --plan",
+)
+parser.add_argument(
+    "--input-price",
+    type=float,
+    help="USD per million prompt tokens, for --plan cost estimates",
+)
+parser.add_argument(
+    "--output-price",
+    type=float,
+    help="USD per million completion tokens, for --plan cost estimates",
+)
+parser.add_argument(
+    "--metrics-file",
+    help="OpenMetrics textfile rewritten every --metrics-interval seconds with live throughput, in-flight requests, queue depth, error and retry rates, request latency and ETA",
+)
+parser.add_argument(
+    "--metrics-port",
+    type=int,
+    help="Serve the same metrics at http://127.0.0.1:PORT/metrics",
+)
+parser.add_argument(
+    "--metrics-interval",
+    type=float,
+    default=15,
+    help="Seconds between --metrics-file updates (default: 15)",
+)
+cassette_group = parser.add_mutually_exclusive_group()
+cassette_group.add_argument(
+    "--record",
+    metavar="DIR",
+    help="Record every model request and response to a cassette directory",
+)
+cassette_group.add_argument(
+    "--replay",
+    metavar="DIR",
+    help="Serve model responses from a cassette directory instead of the endpoint (no API key or network needed)",
+)
+parser.add_argument(
+    "--replay-pacing",
+    type=float,
+    default=0,
+    help="With --replay, wait this multiple of each recorded latency before returning a response (default: 0, no wait)",
+)
+parser.add_argument(
+    "--profile",
+    choices=["cpu", "mem"],
+    help="Profile the run with cProfile (cpu) or tracemalloc (mem) and print per-phase times (load, schema build, request loop, API calls, tool execution, logging, compare) and the top functions or allocation sites",
+)
+parser.add_argument(
+    "--profile-output",
+    default="profile_generate",
+    help="Path prefix of the pstats or snapshot file and the summary written by --profile (default: profile_generate)",
+)
+parser.add_argument(
+    "--profile-top",
+    type=int,
+    default=15,
+    help="Functions or allocation sites listed in the --profile summary (default: 15)",
+)
+parser.add_argument(
+    "--trace",
+    help="Write hierarchical timing spans to this file in Chrome trace-event format (open in Perfetto or chrome://tracing)",
+)
 
 if len(sys.argv) == 1:
     parser.print_help()
@@ -1051,49 +2328,236 @@ if len(sys.argv) == 1:
 
 args = parser.parse_args()
 
+if args.profile:
+    profiler.configure(args.profile, args.profile_output, args.profile_top)
+if args.trace:
+    tracer.configure(args.trace)
+
+if args.temperature is not None:
+    sampling_params["temperature"] = args.temperature
+api_coalescer.enabled = args.coalesce_requests == "on" or (
+    args.coalesce_requests == "auto" and args.temperature == 0
+)
+
+if args.samples_per_turn < 1:
+    print("Error: --samples-per-turn must be at least 1")
+    sys.exit(1)
+if args.samples_per_turn > 1 and args.mode not in ("chat_tools", "system_prompt"):
+    print(
+        "Error: --samples-per-turn is only supported in chat_tools and system_prompt modes"
+    )
+    sys.exit(1)
+
+if args.max_tool_rounds < 1:
+    print("Error: --max-tool-rounds must be at least 1")
+    sys.exit(1)
+turn_limits = TurnLimits(
+    max_tool_rounds=args.max_tool_rounds,
+    max_conversation_tokens=args.max_conversation_tokens,
+    max_turn_seconds=args.max_turn_seconds,
+    conversation_seconds=args.conversation_deadline,
+    run_seconds=args.run_deadline,
+)
+
+retry_on = [name.strip() for name in args.retry_on.split(",") if name.strip()]
+unknown_classes = sorted(set(retry_on) - set(ERROR_CLASSES))
+if unknown_classes:
+    print(f"Error: Unknown retry error classes: {', '.join(unknown_classes)}")
+    print(f"Available classes are: {', '.join(ERROR_CLASSES)}")
+    sys.exit(1)
+retry_policy = RetryPolicy(
+    max_attempts=args.max_attempts,
+    base_delay=args.retry_base_delay,
+    max_delay=args.retry_max_delay,
+    attempt_timeout=args.attempt_timeout,
+    retry_on=retry_on,
+    hedge=args.hedge,
+    hedge_percentile=args.hedge_percentile,
+)
+run_metrics.retry_policy = retry_policy
+
+if args.record or args.replay:
+    if args.mode == "batch":
+        print("Error: --record and --replay are not supported in batch mode")
+        sys.exit(1)
+    try:
+        if args.record:
+            cassette = Cassette(args.record, "record")
+        else:
+            cassette = Cassette(args.replay, "replay", args.replay_pacing)
+    except OSError as e:
+        print(f"Error opening cassette: {e}")
+        sys.exit(1)
+
+tool_concurrency = {}
+if args.tool_concurrency:
+    try:
+        for item in args.tool_concurrency.split(","):
+            name, limit = item.split("=")
+            tool_concurrency[name.strip()] = int(limit)
+    except ValueError as e:
+        print(f"Error parsing tool-concurrency argument: {e}")
+        print("Tool limits should look like 'file_search=2,get_weather=8'")
+        sys.exit(1)
+
+result_cache = None
+if args.tool_cache_size > 0:
+    result_cache = tool_cache.ToolResultCache(
+        max_entries=args.tool_cache_size, path=args.tool_cache_file
+    )
+
+executor = ToolExecutor(
+    *tools,
+    max_workers=args.tool_workers,
+    tool_concurrency=tool_concurrency,
+    tool_timeout=args.tool_timeout,
+    result_cache=result_cache,
+)
+
+# Parse samples argument if provided
+selected_samples = set()
+if args.samples:
+    try:
+        selected_samples = parse_sample_ids(args.samples)
+        print(f"Running only samples: {args.samples}")
+    except ValueError as e:
+        print(f"Error parsing samples argument: {e}")
+        print("Samples should be comma-separated integers or ranges (e.g., '1,3,5-10')")
+        sys.exit(1)
+
+if args.plan:
+    # Forecast the run offline; no endpoint or API key is needed
+    plan_overheads = {}
+
+    def plan_overhead(conversation):
+        """Return (tool definition tokens per request, uses tools) for a conversation."""
+        conversation_tools = tuple(conversation.get("tools", []))
+        if conversation_tools not in plan_overheads:
+            plan_executor = (
+                executor.create_filtered_executor(list(conversation_tools))
+                if conversation_tools
+                else executor
+            )
+            if args.mode == "system_prompt":
+                definitions = plan_executor.get_system_prompt()
+            elif args.mode == "responses":
+                definitions = json.dumps(plan_executor.get_tool_schemas())
+            else:
+                definitions = json.dumps(plan_executor.get_chat_tool_schemas())
+            plan_overheads[conversation_tools] = (
+                estimate_tokens(definitions),
+                bool(plan_executor.get_chat_tool_schemas()),
+            )
+        return plan_overheads[conversation_tools]
+
+    plan = plan_run(
+        iter_conversations(args.conversations_file, selected_samples), plan_overhead
+    )
+    print(
+        format_plan(
+            plan,
+            args.mode,
+            args.workers,
+            args.plan_request_seconds,
+            rpm=args.plan_rpm,
+            tpm=args.plan_tpm,
+            input_price=args.input_price,
+            output_price=args.output_price,
+        )
+    )
+    sys.exit(0)
+
+if args.abort_below is not None and not args.golden:
+    print("Error: --abort-below requires --golden")
+    sys.exit(1)
+if args.target_ci_width is not None and not args.golden:
+    print("Error: --target-ci-width requires --golden")
+    sys.exit(1)
+if args.golden:
+    try:
+        with profiler.phase("load"):
+            golden_logs = load_conversation_logs(args.golden)
+    except OSError as e:
+        print(f"Error reading golden log {args.golden}: {e}")
+        sys.exit(1)
+    print(f"Loaded {len(golden_logs)} golden turns from {args.golden}")
+    live_scorer = LiveScorer(
+        golden_logs, args.abort_below, args.abort_min_turns, args.target_ci_width
+    )
+
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and args.replay:
+    # Replayed runs never reach the endpoint
+    api_key = "replay"
+if not api_key and not args.endpoints:
     print(
         "Error: The OPENAI_API_KEY environment variable is not set. Please set it to your OpenAI (or any other endpoint's API key) as shown in the README."
     )
     sys.exit(1)
 base_url = os.getenv("BASE_URL", "https://api.openai.com/v1")
 try:
-    client = openai.OpenAI(api_key=api_key, base_url=base_url)
+    if args.endpoints:
+        endpoints = load_endpoints(args.endpoints, api_key)
+    else:
+        endpoints = [Endpoint(base_url, api_key)]
 except Exception as e:
     print(f"Error initializing OpenAI client: {e}")
     sys.exit(1)
+endpoint_pool = EndpointPool(endpoints, args.endpoint_failures, args.endpoint_cooldown)
+# File search, batches and the model check use the first endpoint's account
+client = endpoint_pool.primary.client
+base_url = endpoint_pool.primary.base_url
+if len(endpoints) > 1:
+    print(f"Balancing conversations across {len(endpoints)} endpoints")
 
 conversations_file = args.conversations_file
 
 model = args.model
-# Check if the specified model is available
-try:
-    available_models = [model.id for model in client.models.list()]
-    if model not in available_models:
-        print(f"Error: Model '{model}' is not available. Available models are:")
-        print("\n".join(available_models))
+# Check if the specified model is available (replayed runs stay offline)
+if not args.replay:
+    for endpoint in endpoint_pool.endpoints:
+        try:
+            available_models = [model.id for model in endpoint.client.models.list()]
+        except Exception as e:
+            if len(endpoint_pool.endpoints) == 1:
+                print(f"Error: Could not verify model availability: {e}")
+                sys.exit(1)
+            # An unreachable replica is retried after its cooldown
+            print(f"Warning: Ejecting endpoint {endpoint.base_url} for now: {e}")
+            endpoint_pool.eject(endpoint)
+            continue
+        if model not in available_models:
+            print(
+                f"Error: Model '{model}' is not available at {endpoint.base_url}. Available models are:"
+            )
+            print("\n".join(available_models))
+            sys.exit(1)
+    if all(endpoint.ejections for endpoint in endpoint_pool.endpoints):
+        print("Error: Could not reach any endpoint to verify model availability")
         sys.exit(1)
-except Exception as e:
-    print(f"Error: Could not verify model availability: {e}")
-    sys.exit(1)
 
 use_system_prompt = args.mode == "system_prompt"
 debug = args.debug
 
+# Conversations are parsed lazily; only the selected samples are constructed
 print(f"Loading conversations from {conversations_file}")
-conversations = load_conversations_from_yaml(conversations_file)
 
-# Parse samples argument if provided
-selected_samples = set()
-if args.samples:
-    try:
-        selected_samples = {int(x.strip()) for x in args.samples.split(",")}
-        print(f"Running only samples: {sorted(selected_samples)}")
-    except ValueError as e:
-        print(f"Error parsing samples argument: {e}")
-        print("Samples should be comma-separated integers (e.g., '1,3,5,6,10')")
-        sys.exit(1)
+
+def select_conversations():
+    """Lazily read the selected (sample_id, conversation) pairs."""
+    selected = iter_conversations(conversations_file, selected_samples)
+    if args.target_ci_width is not None:
+        # Only conversations in the golden log contribute to the estimate
+        golden_samples = {sample_id for sample_id, _ in golden_logs}
+        selected = (item for item in selected if item[0] in golden_samples)
+    return selected
+
+
+conversations = select_conversations()
+if profiler.enabled:
+    # Parse every conversation up front so loading is profiled as its own phase
+    with profiler.phase("load"):
+        conversations = list(conversations)
 
 # Determine output filename
 if args.output:
@@ -1108,58 +2572,210 @@ else:
 # Create separate console log filename
 console_log_filename = log_filename.replace(".jsonl", "_console.log")
 
-# Prepare conversations for parallel processing
-conversation_data_list = []
-sample_id = 0
-conversations_run = 0
+schedule = args.schedule
+history = args.history if args.history is not None else [log_filename]
+if schedule == "auto":
+    if args.target_ci_width is not None:
+        schedule = "stratified"
+    elif args.workers > 1:
+        # Sort within a bounded window so the file is still streamed; samples
+        # without earlier timings are estimated from their turn count
+        conversations = iter_longest_first(
+            conversations,
+            load_sample_durations(history),
+            load_turn_seconds(history),
+        )
+        print(
+            f"Dispatching conversations longest-first among the next {LONGEST_FIRST_WINDOW} in the file"
+        )
+        schedule = "fifo"
+    else:
+        schedule = "fifo"
+if schedule == "stratified":
+    conversations = order_stratified(list(conversations), args.stratify_by, args.seed)
+    print(f"Dispatching conversations in random order stratified by {args.stratify_by}")
+elif schedule == "longest-first":
+    conversations = order_longest_first(
+        list(conversations), load_sample_durations(history)
+    )
+    print("Dispatching conversations longest-first")
+
+# Per-run settings shared by every conversation
+run_options = {
+    "file_search_backend": args.file_search_backend,
+    "file_search_index_dir": args.file_search_index_dir,
+    "vector_store_registry": None,
+    "samples_per_turn": args.samples_per_turn,
+}
+if args.file_search_backend == "openai" and not args.no_reuse_vector_stores:
+    run_options["vector_store_registry"] = VectorStoreRegistry(
+        client,
+        args.vector_store_registry,
+        collect_orphans=args.collect_orphan_vector_stores,
+    )
+
 
-for conversation in conversations:
-    sample_id += 1
+def iter_conversation_data():
+    """Package each selected conversation with the data needed to process it.
 
-    # Skip if samples are specified and this sample is not in the list
-    if selected_samples and sample_id not in selected_samples:
-        continue
+    Stops early once no further conversation should be started.
+    """
+    for sample_id, conversation in conversations:
+        if dispatch_stopped():
+            return
+        yield (
+            conversation,
+            sample_id,
+            args.mode,
+            model,
+            use_system_prompt,
+            log_filename,
+            console_log_filename,
+            debug,
+            client,
+            executor,
+            base_url,
+            run_options,
+        )
 
-    conversations_run += 1
 
-    # Package all data needed for parallel processing
-    conversation_data = (
-        conversation,
-        sample_id,
-        args.mode,
-        model,
-        use_system_prompt,
-        log_filename,
-        console_log_filename,
-        debug,
-        client,
-        executor,
-        base_url,
+if args.prefetch > 0 and args.mode != "batch":
+    resource_prefetcher = Prefetcher(args.prefetch, release_conversation_tools)
+
+
+def conversation_data_stream():
+    """Iterate the conversation data, prefetching file search for queued conversations."""
+    if resource_prefetcher is None:
+        return iter_conversation_data()
+    return resource_prefetcher.iter_ahead(
+        iter_conversation_data(), file_search_prefetch_key, prefetch_file_search
     )
-    conversation_data_list.append(conversation_data)
+
+
+if args.metrics_file or args.metrics_port is not None:
+    # Queue depth and ETA need the planned totals up front; a lazy input is
+    # counted in a separate streaming pass rather than held in memory
+    planned_conversations = planned_turns = 0
+    for _, conversation in (
+        conversations if isinstance(conversations, list) else select_conversations()
+    ):
+        planned_conversations += 1
+        planned_turns += len(conversation["messages"])
+    run_metrics.set_planned(
+        planned_conversations, planned_turns * args.samples_per_turn
+    )
+    if args.metrics_file:
+        run_metrics.start_textfile_export(args.metrics_file, args.metrics_interval)
+    if args.metrics_port is not None:
+        try:
+            run_metrics.serve(args.metrics_port)
+        except OSError as e:
+            print(f"Error serving metrics on port {args.metrics_port}: {e}")
+            sys.exit(1)
+        print(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+
+
+def request_shutdown(signum, frame):
+    """Stop the run cooperatively on the first SIGINT/SIGTERM, abort on the second."""
+    if turn_limits.run_stopped() == "cancelled":
+        raise KeyboardInterrupt
+    turn_limits.cancel()
+    print(
+        f"\nReceived {signal.Signals(signum).name}: finishing in-flight requests and "
+        "logging their turns; no new requests are sent (repeat to abort)"
+    )
+
+
+signal.signal(signal.SIGINT, request_shutdown)
+signal.signal(signal.SIGTERM, request_shutdown)
+
+conversations_run = 0
 
 # Process conversations in parallel or sequentially based on --workers argument
-if args.workers > 1:
+if args.mode == "batch":
+    conversation_data_list = list(iter_conversation_data())
+    conversations_run = len(conversation_data_list)
     print(
-        f"\nProcessing {len(conversation_data_list)} conversations using {args.workers} parallel workers"
+        f"\nProcessing {len(conversation_data_list)} conversations with the Batch API"
     )
-    results = map_with_progress(
+    with profiler.phase("request loop"):
+        results = run_batch_conversations(
+            conversation_data_list, client, args.batch_poll_interval
+        )
+    for result in results:
+        print(result)
+elif args.workers > 1:
+    # Conversations are read lazily unless scheduling already listed them
+    total = len(conversations) if isinstance(conversations, list) else None
+    print(
+        f"\nProcessing {total if total is not None else 'all selected'} conversations using {args.workers} parallel workers"
+    )
+    for result in map_with_progress(
         process_single_conversation,
-        conversation_data_list,
+        conversation_data_stream(),
         num_threads=args.workers,
         desc="Processing conversations",
-    )
-
-    # Print results
-    for result in results:
+        postfix=live_scorer.summary if live_scorer is not None else None,
+        total=total,
+    ):
+        # Conversations skipped after the live scorer stopped the run return None
+        if result is not None:
+            conversations_run += 1
         if result:
-            print(result)
+            tqdm.write(result)
 else:
     # Sequential processing (default)
-    print(f"\nProcessing {len(conversation_data_list)} conversations sequentially")
-    for conversation_data in conversation_data_list:
+    print("\nProcessing conversations sequentially")
+    for conversation_data in conversation_data_stream():
+        conversations_run += 1
         result = process_single_conversation(conversation_data)
         if result:
             print(result)
+        if live_scorer is not None:
+            print(f"Running {live_scorer.summary()}")
+
+if resource_prefetcher is not None:
+    resource_prefetcher.close()
+
+# Let background vector store deletions finish before exiting
+wait_for_cleanup()
+
+# Record what a cancelled or deadline-limited run left undone
+stop_reason = turn_limits.run_stopped()
+if stop_reason is not None or args.conversation_deadline is not None:
+    unfinished = find_unfinished(
+        iter_conversations(conversations_file, selected_samples),
+        load_finished_turns(log_filename),
+        args.samples_per_turn,
+    )
+    if unfinished:
+        print(
+            write_unfinished_summary(
+                log_filename.replace(".jsonl", "_unfinished.json"),
+                stop_reason or "conversation_deadline",
+                log_filename,
+                unfinished,
+            )
+        )
 
 print(f"Logged {conversations_run} conversations to {log_filename}")
+if result_cache is not None:
+    print(result_cache.report())
+if api_coalescer.enabled:
+    print(api_coalescer.report())
+print(retry_policy.report())
+if resource_prefetcher is not None and resource_prefetcher.started:
+    print(resource_prefetcher.report())
+if len(endpoint_pool.endpoints) > 1:
+    print(endpoint_pool.report())
+print(usage_stats.report())
+if cassette is not None:
+    print(cassette.report())
+if args.metrics_file:
+    run_metrics.write_textfile(args.metrics_file)
+if live_scorer is not None:
+    print(live_scorer.report())
+    if live_scorer.aborted:
+        sys.exit(1)
+if stop_reason == "cancelled":
+    sys.exit(130)
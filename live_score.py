@@ -0,0 +1,134 @@
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from score import classify_tool_calls, STATUS_COUNTERS
+
+# Normal quantile for the 95% confidence intervals on accuracy
+CONFIDENCE_Z = 1.96
+
+
+def wilson_interval(
+    successes: int, trials: int, z: float = CONFIDENCE_Z
+) -> Tuple[float, float]:
+    """Return the Wilson score confidence interval of a binomial proportion.
+
+    Unlike the normal approximation it stays inside [0, 1] and is usable for
+    small samples and rates near 0 or 1.
+    """
+    if not trials:
+        return 0.0, 1.0
+    rate = successes / trials
+    denominator = 1 + z * z / trials
+    center = (rate + z * z / (2 * trials)) / denominator
+    margin = (
+        z
+        * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+        / denominator
+    )
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class LiveScorer:
+    """Score each logged turn against a golden log while the run is in progress.
+
+    Turns are classified with the same rules as score.py's compare_tool_calls
+    (the golden log is the first file). Turns the golden log doesn't contain
+    are not scored. Accuracy is the share of scored turns whose tool calls
+    match exactly.
+
+    Args:
+        golden: Tool calls per (sample_id, turn_id), from load_conversation_logs
+        abort_below: Accuracy under which the run should stop early
+        min_turns: Scored turns required before abort_below is applied
+        target_ci_width: Width of the 95% confidence interval on accuracy at
+            which the estimate is precise enough and the run can stop
+    """
+
+    def __init__(
+        self,
+        golden: Dict[Tuple[int, int], List[Dict[str, Any]]],
+        abort_below: Optional[float] = None,
+        min_turns: int = 10,
+        target_ci_width: Optional[float] = None,
+    ):
+        self.golden = golden
+        self.abort_below = abort_below
+        self.min_turns = min_turns
+        self.target_ci_width = target_ci_width
+        self.aborted = False
+        self.precise = False
+        self._lock = threading.Lock()
+        self._counts = {status: 0 for status in STATUS_COUNTERS}
+        self._scored = 0
+
+    def record(
+        self, sample_id: int, turn_id: int, tool_calls: List[Dict[str, Any]]
+    ) -> Optional[str]:
+        """Score one logged turn.
+
+        Returns:
+            The comparison status, or None if the golden log has no such turn
+        """
+        golden_calls = self.golden.get((sample_id, turn_id))
+        if golden_calls is None:
+            return None
+        status = classify_tool_calls(golden_calls, tool_calls)["status"]
+        with self._lock:
+            self._counts[status] += 1
+            self._scored += 1
+            if (
+                not self.aborted
+                and self.abort_below is not None
+                and self._scored >= self.min_turns
+                and self._counts["match"] / self._scored < self.abort_below
+            ):
+                self.aborted = True
+                print(
+                    f"\nAccuracy {self._counts['match'] / self._scored:.1%} after "
+                    f"{self._scored} turns is below --abort-below "
+                    f"{self.abort_below:.1%}; not starting further conversations"
+                )
+            if not self.precise and self.target_ci_width is not None:
+                low, high = wilson_interval(self._counts["match"], self._scored)
+                if high - low < self.target_ci_width:
+                    self.precise = True
+                    print(
+                        f"\nAccuracy 95% CI {low:.1%}-{high:.1%} after {self._scored} "
+                        f"turns is narrower than --target-ci-width "
+                        f"{self.target_ci_width:.1%}; not starting further conversations"
+                    )
+        return status
+
+    @property
+    def stopped(self) -> bool:
+        """Whether no further conversations should be started."""
+        return self.aborted or self.precise
+
+    def interval(self) -> Tuple[float, float]:
+        """Return the 95% confidence interval of the current accuracy."""
+        with self._lock:
+            return wilson_interval(self._counts["match"], self._scored)
+
+    def summary(self) -> str:
+        """Format the running accuracy, e.g. for the progress bar."""
+        with self._lock:
+            matching, scored = self._counts["match"], self._scored
+        if not scored:
+            return "accuracy n/a"
+        return f"accuracy {matching / scored:.1%} ({matching}/{scored})"
+
+    def report(self) -> str:
+        """Format accuracy and counts per status for printing at the end of a run."""
+        with self._lock:
+            counts = dict(self._counts)
+        details = ", ".join(
+            f"{status}: {count}" for status, count in counts.items() if count
+        )
+        line = f"Golden log {self.summary()}"
+        if self._scored:
+            low, high = self.interval()
+            line += f", 95% CI {low:.1%}-{high:.1%}"
+        if details:
+            line += f" [{details}]"
+        return line
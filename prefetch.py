@@ -0,0 +1,102 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, Iterator, Optional
+
+
+class Prefetcher:
+    """Prepares the resources of queued items in the background, ahead of their use.
+
+    iter_ahead() passes items through unchanged while reading depth items
+    ahead of its consumer, starting prepare() for each of them on a
+    background thread. When an item's turn comes, take() returns the Future
+    of its prepared resource, usually already done. Resources that are
+    never taken (e.g. the run stopped first) are handed to release() by
+    discard() or close().
+
+    Args:
+        depth: Items read ahead of the consumer, and threads preparing them
+        release: Frees a prepared resource that will not be used
+    """
+
+    def __init__(self, depth: int, release: Optional[Callable[[Any], None]] = None):
+        self.depth = depth
+        self.release = release
+        self._lock = threading.Lock()
+        self._futures: Dict[Hashable, Future] = {}
+        self._pool = ThreadPoolExecutor(
+            max_workers=depth, thread_name_prefix="prefetch"
+        )
+        self._started = 0
+        self._ready = 0
+
+    def iter_ahead(
+        self,
+        items: Iterable[Any],
+        key: Callable[[Any], Optional[Hashable]],
+        prepare: Callable[[Any], Any],
+    ) -> Iterator[Any]:
+        """Yield items in order, preparing the next depth items in the background.
+
+        Args:
+            items: Items to pass through, read lazily
+            key: Returns the key to take() an item's resource by, or None if
+                the item has nothing to prepare
+            prepare: Builds an item's resource; exceptions are raised by the
+                Future's result()
+        """
+        window: Deque[Any] = deque()
+        for item in items:
+            item_key = key(item)
+            if item_key is not None:
+                future = self._pool.submit(prepare, item)
+                with self._lock:
+                    self._futures[item_key] = future
+                    self._started += 1
+            window.append(item)
+            if len(window) > self.depth:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+    def take(self, item_key: Hashable) -> Optional[Future]:
+        """Claim the Future of an item's prepared resource, or None if none was started."""
+        with self._lock:
+            future = self._futures.pop(item_key, None)
+            if future is not None and future.done():
+                self._ready += 1
+        return future
+
+    def discard(self, item_key: Hashable):
+        """Release an item's resource, once prepared, without using it."""
+        with self._lock:
+            future = self._futures.pop(item_key, None)
+        if future is not None:
+            future.add_done_callback(self._release_result)
+
+    def _release_result(self, future: Future):
+        if self.release is not None and future.exception() is None:
+            try:
+                self.release(future.result())
+            except Exception as e:
+                print(f"Warning: Failed to release prefetched resource: {e}")
+
+    def close(self):
+        """Wait for preparation threads and release resources nobody took."""
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures.clear()
+        for future in futures:
+            future.add_done_callback(self._release_result)
+        self._pool.shutdown(wait=True)
+
+    @property
+    def started(self) -> int:
+        """Number of resources whose preparation was started."""
+        with self._lock:
+            return self._started
+
+    def report(self) -> str:
+        """Format how many prefetched resources were ready when their item started."""
+        with self._lock:
+            return f"Prefetch: {self._ready}/{self._started} resources ready when their conversation started"
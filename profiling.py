@@ -0,0 +1,202 @@
+import atexit
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from typing import Dict, List, Optional
+
+_NOOP_PHASE = nullcontext()
+
+# Frames kept per allocation traceback in mem mode
+TRACEMALLOC_FRAMES = 10
+
+
+class _Phase:
+    """One entry into a named phase on the current thread."""
+
+    __slots__ = ("_profiler", "name", "_nested", "_start", "_memory_start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self._profiler = profiler
+        self.name = name
+        self._nested = False
+
+    def __enter__(self):
+        stack = self._profiler._stack()
+        if stack and stack[-1].name == self.name:
+            # Re-entering the running phase (e.g. a conversation inside the
+            # request loop) just extends it
+            self._nested = True
+            return self
+        if stack:
+            stack[-1]._pause()
+        stack.append(self)
+        self._profiler._count_entry(self.name)
+        self._resume()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._nested:
+            return False
+        self._pause()
+        stack = self._profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1]._resume()
+        return False
+
+    def _resume(self):
+        self._start = time.perf_counter()
+        if self._profiler.mode == "mem":
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+
+    def _pause(self):
+        memory = 0
+        if self._profiler.mode == "mem":
+            memory = tracemalloc.get_traced_memory()[0] - self._memory_start
+        self._profiler._add(self.name, time.perf_counter() - self._start, memory)
+
+
+class Profiler:
+    """Profiles a run with cProfile (cpu) or tracemalloc (mem), broken down by phase.
+
+    Each thread keeps a stack of named phases; entering a nested phase pauses
+    the enclosing one, so wall time (and in mem mode, the net growth of
+    traced memory) is attributed to the innermost phase only. With several
+    threads, concurrent phases share that memory growth.
+
+    Function-level statistics come from one cProfile profile of the whole
+    run, written as a pstats file, or from a tracemalloc snapshot taken at
+    the end. cProfile only follows the thread that enabled it before Python
+    3.12, so there the function statistics miss worker threads.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.mode: Optional[str] = None
+        self._prefix: Optional[str] = None
+        self._top = 15
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profile: Optional[cProfile.Profile] = None
+        self._seconds: Dict[str, float] = {}
+        self._entries: Dict[str, int] = {}
+        self._memory: Dict[str, int] = {}
+        self._finished = False
+
+    def configure(self, mode: str, prefix: str, top: int = 15):
+        """Enable profiling and write the results when the process exits.
+
+        Args:
+            mode: "cpu" for cProfile or "mem" for tracemalloc
+            prefix: Path prefix of the pstats, snapshot and summary files
+            top: Number of functions or allocation sites in the summary
+        """
+        self.mode = mode
+        self._prefix = prefix
+        self._top = top
+        self.enabled = True
+        if mode == "cpu":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        atexit.register(self.finish)
+
+    def phase(self, name: str):
+        """Return a context manager attributing the enclosed block to a phase.
+
+        Returns:
+            A phase context manager (a shared no-op when profiling is disabled)
+        """
+        if not self.enabled:
+            return _NOOP_PHASE
+        return _Phase(self, name)
+
+    def _stack(self) -> List[_Phase]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _count_entry(self, name: str):
+        with self._lock:
+            self._entries[name] = self._entries.get(name, 0) + 1
+
+    def _add(self, name: str, seconds: float, memory: int):
+        with self._lock:
+            self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+            self._memory[name] = self._memory.get(name, 0) + memory
+
+    def finish(self):
+        """Write the profile files and print the summary (once)."""
+        if not self.enabled or self._finished:
+            return
+        self._finished = True
+        try:
+            if self.mode == "cpu":
+                summary = self._finish_cpu()
+            else:
+                summary = self._finish_mem()
+            with open(f"{self._prefix}.summary.txt", "w") as f:
+                f.write(summary + "\n")
+            print(summary)
+        except Exception as e:
+            print(f"Warning: Failed to write profile {self._prefix}: {e}")
+
+    def _phase_lines(self) -> List[str]:
+        with self._lock:
+            phases = sorted(self._seconds, key=self._seconds.get, reverse=True)
+            lines = [
+                f"Profile ({self.mode}) by phase, exclusive of nested phases and summed over threads:"
+            ]
+            for name in phases:
+                line = f"  {name:<16} {self._seconds[name]:10.3f}s  {self._entries.get(name, 0):6} entries"
+                if self.mode == "mem":
+                    line += f"  {self._memory[name] / 1024:+12.1f} KiB"
+                lines.append(line)
+        return lines
+
+    def _finish_cpu(self) -> str:
+        lines = self._phase_lines()
+        self._profile.disable()
+        path = f"{self._prefix}.pstats"
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        stats.dump_stats(path)
+        lines.append(f"  wrote {path} (open with python -m pstats)")
+        lines.append(f"Top {self._top} functions by own time:")
+        top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+        for (filename, lineno, function), (_, calls, own, cumulative, _) in top[
+            : self._top
+        ]:
+            lines.append(
+                f"  {own:9.3f}s own {cumulative:9.3f}s cum {calls:8} calls  "
+                f"{filename}:{lineno}({function})"
+            )
+        return "\n".join(lines)
+
+    def _finish_mem(self) -> str:
+        lines = self._phase_lines()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        path = f"{self._prefix}.snapshot"
+        snapshot.dump(path)
+        lines.append(f"  wrote {path} (load with tracemalloc.Snapshot.load)")
+        lines.append(
+            f"Traced memory: {current / 1024:.1f} KiB current, {peak / 1024:.1f} KiB peak"
+        )
+        lines.append(f"Top {self._top} allocation sites still held:")
+        for stat in snapshot.statistics("lineno")[: self._top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {stat.size / 1024:10.1f} KiB {stat.count:8} blocks  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+        return "\n".join(lines)
+
+
+# Process-wide profiler shared by generate.py and score.py
+profiler = Profiler()
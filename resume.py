@@ -0,0 +1,76 @@
+import json
+import os
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from conversation_loader import format_sample_ids
+from turn_limits import INTERRUPT_REASONS
+
+
+def load_finished_turns(log_filename: str) -> Dict[int, Set[Tuple[int, int]]]:
+    """Collect the turns of each sample that were logged and not interrupted.
+
+    Turns cut off by cancellation or a deadline don't count as finished;
+    turns truncated by other limits (e.g. max_tool_rounds) do.
+
+    Returns:
+        Dict mapping sample_id to its finished (turn_id, choice_index) pairs
+    """
+    finished: Dict[int, Set[Tuple[int, int]]] = {}
+    if not os.path.exists(log_filename):
+        return finished
+    with open(log_filename, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            sample_id = entry.get("sample_id")
+            if sample_id is None or entry.get("truncation_reason") in INTERRUPT_REASONS:
+                continue
+            finished.setdefault(sample_id, set()).add(
+                (entry.get("turn_id"), entry.get("choice_index", 0))
+            )
+    return finished
+
+
+def find_unfinished(
+    conversations: Iterable[Tuple[int, Dict[str, Any]]],
+    finished: Dict[int, Set[Tuple[int, int]]],
+    samples_per_turn: int = 1,
+) -> List[int]:
+    """Return the sample IDs whose turns were not all finished, in file order."""
+    return [
+        sample_id
+        for sample_id, conversation in conversations
+        if len(finished.get(sample_id, ()))
+        < len(conversation.get("messages", [])) * samples_per_turn
+    ]
+
+
+def write_unfinished_summary(
+    path: str, reason: str, log_filename: str, sample_ids: List[int]
+) -> str:
+    """Write the unfinished samples to a JSON file and return a rerun hint.
+
+    Args:
+        path: Summary file to write
+        reason: Why the run stopped, e.g. "cancelled" or "run_deadline"
+        log_filename: Output log of the stopped run
+        sample_ids: Unfinished samples from find_unfinished
+    """
+    samples_arg = format_sample_ids(sample_ids)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "reason": reason,
+                "log": log_filename,
+                "unfinished_samples": sample_ids,
+                "samples_arg": samples_arg,
+            },
+            f,
+            indent=2,
+        )
+    return (
+        f"{len(sample_ids)} conversations unfinished ({reason}); written to {path}. "
+        f'Rerun them with --samples "{samples_arg}"'
+    )
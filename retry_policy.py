@@ -0,0 +1,202 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+import openai
+
+# Error classes that can be selected with --retry-on
+ERROR_CLASSES = {
+    "connection": (openai.APIConnectionError,),
+    "timeout": (openai.APITimeoutError,),
+    "rate_limit": (openai.RateLimitError,),
+    "server": (openai.InternalServerError,),
+    "conflict": (openai.ConflictError,),
+}
+
+# Number of recent latencies used to estimate the hedging threshold
+LATENCY_WINDOW = 1000
+
+
+class RetryPolicy:
+    """Retry transient API errors with jittered exponential backoff, and hedge slow calls.
+
+    Each attempt may be given its own timeout. Retryable failures wait a
+    random delay between 0 and min(max_delay, base_delay * 2**attempt)
+    ("full jitter"), or longer if the server sent a Retry-After header.
+
+    With hedging enabled, an attempt that is still running after the observed
+    latency percentile of its endpoint (base URL and API) gets a duplicate
+    request, and whichever answer arrives first is used. Hedging starts once
+    min_hedge_samples successful calls have been timed. The primary and the
+    hedge then each run on a thread of their own, so an attempt that lost
+    the race (and runs until it answers or its timeout expires) never holds
+    up later calls.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        attempt_timeout: Optional[float] = None,
+        retry_on: Iterable[str] = tuple(ERROR_CLASSES),
+        hedge: bool = False,
+        hedge_percentile: float = 95,
+        min_hedge_samples: int = 20,
+    ):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.retryable = tuple(
+            error_type for name in retry_on for error_type in ERROR_CLASSES[name]
+        )
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_samples = min_hedge_samples
+        self._lock = threading.Lock()
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._clients: Dict[int, Tuple[Any, Any]] = {}
+        self._stats = {"retries": 0, "hedges": 0, "hedge_wins": 0}
+
+    def call(self, client, api: str, request_params: Dict[str, Any]) -> Any:
+        """Call client.<api>.create(**request_params) under the retry and hedging policy.
+
+        The SDK's own retries are turned off for these calls so attempts
+        aren't multiplied.
+
+        Args:
+            client: OpenAI client
+            api: Resource path of the create method, e.g. "chat.completions"
+            request_params: Keyword arguments for create
+
+        Returns:
+            The API response
+
+        Raises:
+            The last error once it is not retryable or attempts are exhausted
+        """
+        create = self._create_method(client, api)
+        endpoint = (str(client.base_url), api)
+        params = dict(request_params)
+        if self.attempt_timeout is not None:
+            params["timeout"] = self.attempt_timeout
+
+        for attempt in range(self.max_attempts):
+            try:
+                return self._attempt(endpoint, create, params)
+            except self.retryable as e:
+                if attempt + 1 == self.max_attempts:
+                    raise
+                delay = random.uniform(
+                    0, min(self.max_delay, self.base_delay * 2**attempt)
+                )
+                delay = max(delay, _retry_after(e))
+                with self._lock:
+                    self._stats["retries"] += 1
+                print(
+                    f"Retrying {api} after {type(e).__name__} "
+                    f"(attempt {attempt + 2}/{self.max_attempts}, waiting {delay:.1f}s)"
+                )
+                time.sleep(delay)
+
+    def _create_method(self, client, api) -> Callable[..., Any]:
+        with self._lock:
+            entry = self._clients.get(id(client))
+            if entry is None or entry[0] is not client:
+                entry = (client, client.with_options(max_retries=0))
+                self._clients[id(client)] = entry
+        resource = entry[1]
+        for name in api.split("."):
+            resource = getattr(resource, name)
+        return resource.create
+
+    def _attempt(self, endpoint, create, params):
+        hedge_after = self._hedge_threshold(endpoint) if self.hedge else None
+        if hedge_after is None:
+            start = time.perf_counter()
+            result = create(**params)
+            self._record_latency(endpoint, time.perf_counter() - start)
+            return result
+
+        start = time.perf_counter()
+        primary = _start_thread(create, params)
+        done, _ = wait([primary], timeout=hedge_after)
+        if not done:
+            with self._lock:
+                self._stats["hedges"] += 1
+            backup = _start_thread(create, params)
+            done, _ = wait([primary, backup], return_when=FIRST_COMPLETED)
+            # Prefer a successful answer if the first one to finish failed
+            winner = next(iter(done))
+            if winner.exception() is not None:
+                other = backup if winner is primary else primary
+                if other.exception() is None:
+                    winner = other
+            if winner is backup:
+                with self._lock:
+                    self._stats["hedge_wins"] += 1
+        else:
+            winner = primary
+        result = winner.result()
+        self._record_latency(endpoint, time.perf_counter() - start)
+        return result
+
+    def _record_latency(self, endpoint, latency):
+        with self._lock:
+            latencies = self._latencies.setdefault(
+                endpoint, deque(maxlen=LATENCY_WINDOW)
+            )
+            latencies.append(latency)
+
+    def _hedge_threshold(self, endpoint) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+        if len(latencies) < self.min_hedge_samples:
+            return None
+        index = min(
+            int(len(latencies) * self.hedge_percentile / 100), len(latencies) - 1
+        )
+        return latencies[index]
+
+    def stats(self) -> Dict[str, int]:
+        """Return a copy of the retry and hedging counts."""
+        with self._lock:
+            return dict(self._stats)
+
+    def report(self) -> str:
+        """Format retry and hedging counts for printing at the end of a run."""
+        stats = self.stats()
+        line = f"Retries: {stats['retries']}"
+        if self.hedge:
+            line += f", hedged requests: {stats['hedges']} ({stats['hedge_wins']} won by the hedge)"
+        return line
+
+
+def _start_thread(func: Callable[..., Any], params: Dict[str, Any]) -> Future:
+    """Run func(**params) on a new daemon thread and return its Future."""
+    future: Future = Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(func(**params))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge", daemon=True).start()
+    return future
+
+
+def _retry_after(error) -> float:
+    """Return the server's Retry-After delay in seconds, or 0."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return 0.0
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except (TypeError, ValueError):
+        return 0.0
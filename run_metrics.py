@@ -0,0 +1,307 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Window over which the per-second rates are computed
+RATE_WINDOW_SECONDS = 60.0
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _format_value(value) -> str:
+    # Counters stay exact integers; floats keep full precision
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+class RunMetrics:
+    """Live counters of a generate.py run, rendered in the OpenMetrics text format.
+
+    Request counts, latencies and in-flight requests are tracked here;
+    token totals and retries are read from the run's UsageStats and
+    RetryPolicy when rendering. Per-second rates cover the last
+    RATE_WINDOW_SECONDS, sampled whenever the metrics are rendered.
+
+    Args:
+        usage_stats: The run's UsageStats
+        retry_policy: The run's RetryPolicy, or None before it is configured
+    """
+
+    def __init__(self, usage_stats, retry_policy=None):
+        self.usage_stats = usage_stats
+        self.retry_policy = retry_policy
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._latency_sum = 0.0
+        self._planned_conversations = 0
+        self._planned_turns = 0
+        self._conversations_started = 0
+        self._conversations_finished = 0
+        self._turns_logged = 0
+        self._samples: Deque[Tuple[float, Dict[str, int]]] = deque()
+
+    def set_planned(self, conversations: int, turns: int):
+        """Record how many conversations and turns the run will process."""
+        with self._lock:
+            self._planned_conversations = conversations
+            self._planned_turns = turns
+
+    @contextmanager
+    def request(self):
+        """Time one model API call (including its retries) and count it in flight."""
+        with self._lock:
+            self._in_flight += 1
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            bucket = next(
+                (i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound),
+                len(LATENCY_BUCKETS),
+            )
+            with self._lock:
+                self._in_flight -= 1
+                self._requests += 1
+                self._errors += failed
+                self._bucket_counts[bucket] += 1
+                self._latency_sum += latency
+
+    def conversation_started(self):
+        with self._lock:
+            self._conversations_started += 1
+
+    def conversation_finished(self):
+        with self._lock:
+            self._conversations_finished += 1
+
+    def turn_logged(self):
+        with self._lock:
+            self._turns_logged += 1
+
+    def _counters(self) -> Dict[str, int]:
+        usage = self.usage_stats.totals()
+        retries = self.retry_policy.stats()["retries"] if self.retry_policy else 0
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "errors": self._errors,
+                "retries": retries,
+                "tokens": usage["prompt_tokens"] + usage["completion_tokens"],
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+            }
+
+    def _rates(self, now: float, counters: Dict[str, int]) -> Dict[str, float]:
+        with self._lock:
+            self._samples.append((now, counters))
+            while self._samples and now - self._samples[0][0] > RATE_WINDOW_SECONDS:
+                self._samples.popleft()
+            if len(self._samples) > 1:
+                then, previous = self._samples[0]
+            else:
+                then, previous = self._start, dict.fromkeys(counters, 0)
+        elapsed = max(now - then, 1e-9)
+        return {
+            key: (counters[key] - previous[key]) / elapsed
+            for key in ("requests", "errors", "retries", "tokens")
+        }
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate the time left from the remaining turns and the turn rate so far."""
+        with self._lock:
+            logged, planned = self._turns_logged, self._planned_turns
+        if not logged or not planned:
+            return None
+        elapsed = time.monotonic() - self._start
+        return max(planned - logged, 0) * elapsed / logged
+
+    def render(self) -> str:
+        """Return the current metrics as an OpenMetrics text exposition."""
+        now = time.monotonic()
+        counters = self._counters()
+        rates = self._rates(now, counters)
+        eta = self.eta_seconds()
+        with self._lock:
+            gauges = {
+                "in_flight_requests": self._in_flight,
+                "queued_conversations": max(
+                    self._planned_conversations - self._conversations_started, 0
+                ),
+                "active_conversations": self._conversations_started
+                - self._conversations_finished,
+                "remaining_turns": max(self._planned_turns - self._turns_logged, 0),
+            }
+            turns_logged = self._turns_logged
+            conversations_finished = self._conversations_finished
+            bucket_counts = list(self._bucket_counts)
+            latency_sum = self._latency_sum
+
+        lines: List[str] = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# TYPE generate_{name} {kind}")
+            lines.append(f"# HELP generate_{name} {help_text}")
+            for suffix, value in samples:
+                lines.append(f"generate_{name}{suffix} {_format_value(value)}")
+
+        metric(
+            "requests",
+            "counter",
+            "Model API requests, counting retries of one request once.",
+            [("_total", counters["requests"])],
+        )
+        metric(
+            "request_errors",
+            "counter",
+            "Model API requests that failed after all retries.",
+            [("_total", counters["errors"])],
+        )
+        metric(
+            "retries",
+            "counter",
+            "Retried model API attempts.",
+            [("_total", counters["retries"])],
+        )
+        metric(
+            "tokens",
+            "counter",
+            "Tokens reported by API usage.",
+            [
+                ('_total{kind="prompt"}', counters["prompt_tokens"]),
+                ('_total{kind="completion"}', counters["completion_tokens"]),
+            ],
+        )
+        metric(
+            "turns_logged",
+            "counter",
+            "Conversation turns written to the output log.",
+            [("_total", turns_logged)],
+        )
+        metric(
+            "conversations_finished",
+            "counter",
+            "Conversations that finished, successfully or not.",
+            [("_total", conversations_finished)],
+        )
+        for name, help_text in (
+            ("requests", "Model API requests per second"),
+            ("errors", "Failed model API requests per second"),
+            ("retries", "Retried attempts per second"),
+            ("tokens", "Prompt and completion tokens per second"),
+        ):
+            metric(
+                f"{name}_per_second",
+                "gauge",
+                f"{help_text} over the last {RATE_WINDOW_SECONDS:g}s.",
+                [("", rates[name])],
+            )
+        metric(
+            "in_flight_requests",
+            "gauge",
+            "Model API requests currently waiting for a response.",
+            [("", gauges["in_flight_requests"])],
+        )
+        metric(
+            "queued_conversations",
+            "gauge",
+            "Conversations not yet started.",
+            [("", gauges["queued_conversations"])],
+        )
+        metric(
+            "active_conversations",
+            "gauge",
+            "Conversations currently running.",
+            [("", gauges["active_conversations"])],
+        )
+        metric(
+            "remaining_turns",
+            "gauge",
+            "Planned turns not yet logged.",
+            [("", gauges["remaining_turns"])],
+        )
+        if eta is not None:
+            metric(
+                "eta_seconds",
+                "gauge",
+                "Estimated seconds until all planned turns are logged.",
+                [("", eta)],
+            )
+
+        cumulative = 0
+        histogram = []
+        for bound, count in zip(LATENCY_BUCKETS, bucket_counts):
+            cumulative += count
+            histogram.append((f'_bucket{{le="{_format_value(bound)}"}}', cumulative))
+        histogram.append(('_bucket{le="+Inf"}', sum(bucket_counts)))
+        histogram.append(("_count", sum(bucket_counts)))
+        histogram.append(("_sum", latency_sum))
+        metric(
+            "request_latency_seconds",
+            "histogram",
+            "Model API request latency, including retries.",
+            histogram,
+        )
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """Atomically replace path with the current metrics."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_textfile_export(self, path: str, interval: float):
+        """Rewrite path every interval seconds from a background thread."""
+
+        def export_loop():
+            while True:
+                try:
+                    self.write_textfile(path)
+                except OSError as e:
+                    print(f"Error writing metrics file {path}: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=export_loop, name="metrics-file", daemon=True).start()
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve the metrics at http://host:port/metrics from a background thread."""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep scrapes out of the console output
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(
+            target=server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        return server
@@ -0,0 +1,222 @@
+import math
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Offline stand-ins for what the model will do, used only for forecasting
+COMPLETION_TOKENS = 150  # final assistant answer
+TOOL_CALL_TOKENS = 25  # assistant message carrying one tool call
+TOOL_OUTPUT_TOKENS = 100  # tool message returned to the model
+MESSAGE_OVERHEAD_TOKENS = 4  # role and delimiters around every message
+REPLY_OVERHEAD_TOKENS = 3  # priming for the assistant's reply
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of BPE tokens in text without a tokenizer.
+
+    Each punctuation mark counts as one token and each word as one token per
+    four characters. This is rough, but close enough for sizing a run.
+    """
+    return sum(
+        max(1, math.ceil(len(piece) / 4)) if piece[0].isalnum() else 1
+        for piece in _TOKEN_RE.findall(text)
+    )
+
+
+def plan_conversation(
+    conversation: Dict[str, Any], overhead_tokens: int, uses_tools: bool
+) -> List[Dict[str, int]]:
+    """Forecast the requests and tokens of each turn of one conversation.
+
+    The minimum assumes every turn is answered directly in one request. The
+    expected case assumes each turn of a conversation with tools makes one
+    tool round, i.e. two requests with a tool call and output in between.
+
+    Args:
+        conversation: Conversation dict with its user "messages"
+        overhead_tokens: Tokens added to every request by tool schemas or a
+            tool-describing system prompt
+        uses_tools: Whether the conversation has any tools available
+
+    Returns:
+        One dict per turn with min/expected requests, prompt tokens and
+        completion tokens, and the largest single-request prompt
+    """
+    turns = []
+    history_tokens = 0
+    for user_message in conversation.get("messages", []):
+        history_tokens += estimate_tokens(str(user_message)) + MESSAGE_OVERHEAD_TOKENS
+        first_prompt = overhead_tokens + history_tokens + REPLY_OVERHEAD_TOKENS
+        turn = {
+            "min_requests": 1,
+            "min_prompt_tokens": first_prompt,
+            "expected_requests": 1,
+            "expected_prompt_tokens": first_prompt,
+            "expected_completion_tokens": COMPLETION_TOKENS,
+            "max_request_prompt_tokens": first_prompt,
+        }
+        if uses_tools:
+            tool_round_tokens = (
+                TOOL_CALL_TOKENS + TOOL_OUTPUT_TOKENS + 2 * MESSAGE_OVERHEAD_TOKENS
+            )
+            second_prompt = first_prompt + tool_round_tokens
+            turn["expected_requests"] = 2
+            turn["expected_prompt_tokens"] += second_prompt
+            turn["expected_completion_tokens"] += TOOL_CALL_TOKENS
+            turn["max_request_prompt_tokens"] = second_prompt
+            history_tokens += tool_round_tokens
+        history_tokens += COMPLETION_TOKENS + MESSAGE_OVERHEAD_TOKENS
+        turns.append(turn)
+    return turns
+
+
+def plan_run(
+    conversations: Iterable[Tuple[int, Dict[str, Any]]],
+    overhead_for: Callable[[Dict[str, Any]], Tuple[int, bool]],
+) -> Dict[str, Any]:
+    """Forecast requests and tokens for every selected conversation.
+
+    Args:
+        conversations: (sample_id, conversation) pairs
+        overhead_for: Returns (per-request overhead tokens, uses tools) for a
+            conversation, based on the tools it will be given
+
+    Returns:
+        Dict with run totals and a per-sample breakdown
+    """
+    totals = {
+        "conversations": 0,
+        "turns": 0,
+        "min_requests": 0,
+        "expected_requests": 0,
+        "min_prompt_tokens": 0,
+        "expected_prompt_tokens": 0,
+        "expected_completion_tokens": 0,
+    }
+    samples = []
+    overheads = []
+    largest = (0, None, None)
+    for sample_id, conversation in conversations:
+        overhead_tokens, uses_tools = overhead_for(conversation)
+        overheads.append(overhead_tokens)
+        turns = plan_conversation(conversation, overhead_tokens, uses_tools)
+        totals["conversations"] += 1
+        totals["turns"] += len(turns)
+        for turn_id, turn in enumerate(turns, 1):
+            for key in totals:
+                if key in turn:
+                    totals[key] += turn[key]
+            if turn["max_request_prompt_tokens"] > largest[0]:
+                largest = (turn["max_request_prompt_tokens"], sample_id, turn_id)
+        samples.append(
+            {
+                "sample_id": sample_id,
+                "turns": len(turns),
+                "expected_requests": sum(t["expected_requests"] for t in turns),
+            }
+        )
+
+    return {
+        **totals,
+        "overhead_tokens": overheads,
+        "largest_request": largest,
+        "samples": samples,
+    }
+
+
+def estimate_wall_seconds(
+    plan: Dict[str, Any],
+    workers: int,
+    request_seconds: float,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+) -> Tuple[float, str]:
+    """Estimate the run's wall time and what bounds it.
+
+    Turns within a conversation are sequential, so the run takes at least as
+    long as its longest conversation, and at least total work / workers. Rate
+    limits add lower bounds of requests / RPM and tokens / TPM.
+
+    Returns:
+        Tuple of (seconds, name of the binding constraint)
+    """
+    if not plan["samples"]:
+        return 0.0, "no conversations"
+    conversation_seconds = [
+        sample["expected_requests"] * request_seconds for sample in plan["samples"]
+    ]
+    bounds = {
+        "longest conversation": max(conversation_seconds),
+        "worker count": sum(conversation_seconds) / max(workers, 1),
+    }
+    if rpm:
+        bounds["request rate limit"] = plan["expected_requests"] / rpm * 60
+    if tpm:
+        tokens = plan["expected_prompt_tokens"] + plan["expected_completion_tokens"]
+        bounds["token rate limit"] = tokens / tpm * 60
+    constraint = max(bounds, key=bounds.get)
+    return bounds[constraint], constraint
+
+
+def format_plan(
+    plan: Dict[str, Any],
+    mode: str,
+    workers: int,
+    request_seconds: float,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    input_price: Optional[float] = None,
+    output_price: Optional[float] = None,
+) -> str:
+    """Format a run plan for printing.
+
+    Args:
+        plan: Result of plan_run
+        mode: API mode the run will use
+        workers: Number of parallel conversation workers
+        request_seconds: Assumed latency of one model request
+        rpm: Requests-per-minute limit of the endpoint, if any
+        tpm: Tokens-per-minute limit of the endpoint, if any
+        input_price: USD per million prompt tokens, if known
+        output_price: USD per million completion tokens, if known
+    """
+    overheads = plan["overhead_tokens"] or [0]
+    lines = [
+        f"Plan for {plan['conversations']} conversations ({plan['turns']} turns) in {mode} mode",
+        f"  Tool definitions: ~{sum(overheads) / len(overheads):.0f} tokens per request on average "
+        f"(min {min(overheads)}, max {max(overheads)})",
+        f"  Requests: {plan['min_requests']} minimum, ~{plan['expected_requests']} expected "
+        f"(one tool round per turn when tools are available)",
+        f"  Prompt tokens: ~{plan['min_prompt_tokens']:,} minimum, "
+        f"~{plan['expected_prompt_tokens']:,} expected",
+        f"  Completion tokens: ~{plan['expected_completion_tokens']:,} expected",
+    ]
+    largest_tokens, sample_id, turn_id = plan["largest_request"]
+    if sample_id is not None:
+        lines.append(
+            f"  Largest request: ~{largest_tokens:,} prompt tokens (sample {sample_id}, turn {turn_id})"
+        )
+
+    if input_price is not None and output_price is not None:
+        min_cost = plan["min_prompt_tokens"] * input_price / 1e6 + (
+            plan["turns"] * COMPLETION_TOKENS * output_price / 1e6
+        )
+        expected_cost = (
+            plan["expected_prompt_tokens"] * input_price
+            + plan["expected_completion_tokens"] * output_price
+        ) / 1e6
+        lines.append(
+            f"  Cost: ~${min_cost:.2f} minimum, ~${expected_cost:.2f} expected"
+        )
+    else:
+        lines.append("  Cost: pass --input-price and --output-price to estimate")
+
+    seconds, constraint = estimate_wall_seconds(
+        plan, workers, request_seconds, rpm, tpm
+    )
+    lines.append(
+        f"  Wall time: ~{seconds / 60:.1f} min with --workers {workers} at "
+        f"{request_seconds:g}s per request (bound by {constraint})"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,225 @@
+import heapq
+import json
+import os
+import random
+import statistics
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+# Seconds per turn assumed when no earlier log has any timings
+DEFAULT_TURN_SECONDS = 5.0
+
+# Conversations read ahead by iter_longest_first to pick the longest among them
+LONGEST_FIRST_WINDOW = 500
+
+
+def iter_timed_turns(log_filenames: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Yield the logged turns that have a sample_id and a duration_seconds.
+
+    Turns without a duration_seconds field (logs written before timings were
+    recorded) and unreadable lines are skipped; missing logs are ignored.
+
+    Args:
+        log_filenames: JSONL output logs from earlier generate.py runs
+    """
+    for log_filename in log_filenames:
+        if not os.path.exists(log_filename):
+            continue
+        with open(log_filename, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if (
+                    entry.get("duration_seconds") is not None
+                    and entry.get("sample_id") is not None
+                ):
+                    yield entry
+
+
+def load_sample_durations(log_filenames: Iterable[str]) -> Dict[int, float]:
+    """Sum the logged turn durations of each sample in earlier output logs.
+
+    Turns are accumulated per sample and choice_index, so the branches of a
+    run with several samples per turn are kept apart and then added up, as
+    they run one after another. When a sample appears in several logs, or
+    several times in one appended log, the most recent run wins.
+
+    Args:
+        log_filenames: JSONL output logs from earlier generate.py runs
+
+    Returns:
+        Dict mapping sample_id to its total duration in seconds
+    """
+    # sample_id -> choice_index -> seconds of the sample's most recent run
+    runs: Dict[int, Dict[int, float]] = {}
+    for entry in iter_timed_turns(log_filenames):
+        sample_id = entry["sample_id"]
+        choice_index = entry.get("choice_index", 0)
+        first_turn = entry.get("turn_id") == 1
+        branches = runs.get(sample_id)
+        if branches is None or (first_turn and choice_index == 0):
+            # The first turn of choice 0 starts a new run of the sample
+            branches = runs[sample_id] = {}
+        if first_turn:
+            branches[choice_index] = 0.0
+        branches[choice_index] = (
+            branches.get(choice_index, 0.0) + entry["duration_seconds"]
+        )
+    return {sample_id: sum(branches.values()) for sample_id, branches in runs.items()}
+
+
+def load_turn_seconds(log_filenames: Iterable[str]) -> float:
+    """Return the median logged duration of one turn in earlier output logs.
+
+    Args:
+        log_filenames: JSONL output logs from earlier generate.py runs
+
+    Returns:
+        Median seconds per turn, or DEFAULT_TURN_SECONDS without timings
+    """
+    durations = [entry["duration_seconds"] for entry in iter_timed_turns(log_filenames)]
+    return statistics.median(durations) if durations else DEFAULT_TURN_SECONDS
+
+
+def estimate_duration(
+    sample_id: int,
+    conversation: Dict[str, Any],
+    sample_durations: Dict[int, float],
+    turn_seconds: float,
+) -> float:
+    """Estimate how long one conversation will take to run.
+
+    Uses the sample's recorded duration, or else its turn count times
+    turn_seconds.
+    """
+    if sample_id in sample_durations:
+        return sample_durations[sample_id]
+    return max(len(conversation.get("messages", [])), 1) * turn_seconds
+
+
+def estimate_durations(
+    conversations: List[Tuple[int, Dict[str, Any]]],
+    sample_durations: Dict[int, float],
+) -> Dict[int, float]:
+    """Estimate how long each conversation will take to run.
+
+    Samples with a recorded duration use it. The rest are estimated from their
+    turn count times the median seconds per turn seen in the recorded samples.
+
+    Args:
+        conversations: (sample_id, conversation) pairs to schedule
+        sample_durations: Recorded durations from load_sample_durations
+
+    Returns:
+        Dict mapping sample_id to its estimated duration in seconds
+    """
+    per_turn = [
+        sample_durations[sample_id] / max(len(conversation.get("messages", [])), 1)
+        for sample_id, conversation in conversations
+        if sample_id in sample_durations
+    ]
+    turn_seconds = statistics.median(per_turn) if per_turn else DEFAULT_TURN_SECONDS
+
+    return {
+        sample_id: estimate_duration(
+            sample_id, conversation, sample_durations, turn_seconds
+        )
+        for sample_id, conversation in conversations
+    }
+
+
+def order_longest_first(
+    conversations: List[Tuple[int, Dict[str, Any]]],
+    sample_durations: Dict[int, float],
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """Sort conversations by estimated duration, longest first.
+
+    Starting the longest conversations first keeps a long multi-turn
+    conversation from being the last one running while the other workers
+    sit idle. Ties keep their original order.
+
+    Args:
+        conversations: (sample_id, conversation) pairs in file order
+        sample_durations: Recorded durations from load_sample_durations
+
+    Returns:
+        The same pairs in dispatch order
+    """
+    estimates = estimate_durations(conversations, sample_durations)
+    return sorted(conversations, key=lambda item: -estimates[item[0]])
+
+
+def iter_longest_first(
+    conversations: Iterable[Tuple[int, Dict[str, Any]]],
+    sample_durations: Dict[int, float],
+    turn_seconds: float = DEFAULT_TURN_SECONDS,
+    window: int = LONGEST_FIRST_WINDOW,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield conversations longest-first within a bounded read-ahead window.
+
+    Like order_longest_first, but reads conversations lazily and holds at
+    most window of them, yielding the longest one read so far each time the
+    window is full. Runs of up to window conversations are fully sorted;
+    longer runs are sorted within each stretch of the file.
+
+    Args:
+        conversations: (sample_id, conversation) pairs in file order, read lazily
+        sample_durations: Recorded durations from load_sample_durations
+        turn_seconds: Seconds per turn for samples without a recorded
+            duration, e.g. from load_turn_seconds
+        window: Conversations held at a time
+
+    Yields:
+        The same pairs in dispatch order
+    """
+    pending: List[Tuple[float, int, Tuple[int, Dict[str, Any]]]] = []
+    for position, item in enumerate(conversations):
+        estimate = estimate_duration(item[0], item[1], sample_durations, turn_seconds)
+        heapq.heappush(pending, (-estimate, position, item))
+        if len(pending) > max(window, 1):
+            yield heapq.heappop(pending)[2]
+    while pending:
+        yield heapq.heappop(pending)[2]
+
+
+def stratum_key(conversation: Dict[str, Any], stratify_by: str) -> Hashable:
+    """Return the stratum of a conversation: its tool set or its turn count."""
+    if stratify_by == "turns":
+        return len(conversation.get("messages", []))
+    return tuple(sorted(conversation.get("tools", [])))
+
+
+def order_stratified(
+    conversations: List[Tuple[int, Dict[str, Any]]],
+    stratify_by: str = "tools",
+    seed: Optional[int] = None,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """Shuffle conversations so every prefix is a proportional stratified sample.
+
+    Conversations are grouped by stratum_key and shuffled within each group.
+    The i-th of n conversations in a group is then placed at a random point
+    in [i/n, (i+1)/n) of the run, so each stratum is spread evenly over the
+    dispatch order and a run stopped early has sampled every stratum in
+    proportion to its size.
+
+    Args:
+        conversations: (sample_id, conversation) pairs in file order
+        stratify_by: "tools" (the conversation's tool set) or "turns"
+        seed: Random seed, for a reproducible order
+
+    Returns:
+        The same pairs in dispatch order
+    """
+    rng = random.Random(seed)
+    strata: Dict[Hashable, List[Tuple[int, Dict[str, Any]]]] = {}
+    for item in conversations:
+        strata.setdefault(stratum_key(item[1], stratify_by), []).append(item)
+
+    positioned = []
+    for members in strata.values():
+        rng.shuffle(members)
+        for i, item in enumerate(members):
+            positioned.append(((i + rng.random()) / len(members), item))
+    positioned.sort(key=lambda entry: entry[0])
+    return [item for _, item in positioned]
@@ -17,12 +17,14 @@ from typing import Dict, List, Any, Tuple, Literal
 from rich.console import Console
 from rich.table import Table
 
+from profiling import profiler
+
 
 def get_available_tools() -> Dict[str, callable]:
-    """Dynamically import and inspect all tools from tools_samples module."""
+    """Dynamically import and inspect all tools from sample_tools module."""
     try:
-        # Import the tools_samples module
-        tools_module = importlib.import_module("tools_samples")
+        # Import the sample_tools module
+        tools_module = importlib.import_module("sample_tools")
 
         # Get all functions from the module
         available_tools = {}
@@ -32,7 +34,7 @@ def get_available_tools() -> Dict[str, callable]:
 
         return available_tools
     except ImportError as e:
-        print(f"Warning: Could not import tools_samples module: {e}")
+        print(f"Warning: Could not import sample_tools module: {e}")
         return {}
 
 
@@ -41,7 +43,7 @@ AVAILABLE_TOOLS = get_available_tools()
 
 
 def get_function_type_hints(func_name: str) -> Dict[str, type]:
-    """Get type hints for a function from tools_samples."""
+    """Get type hints for a function from sample_tools."""
     if func_name not in AVAILABLE_TOOLS:
         return {}
 
@@ -65,16 +67,20 @@ def coerce_argument_value(value: Any, param_name: str, func_name: str) -> Any:
         return value
 
     # Handle basic type conversions
-    if param_type is str:
-        return str(value)
-    elif param_type is int:
-        return int(float(value))  # Handle cases where value might be a float string
-    elif param_type is float:
-        return float(value)
-    elif param_type is bool:
-        if isinstance(value, str):
-            return value.lower() in ("true", "1", "yes", "on")
-        return bool(value)
+    try:
+        if param_type is str:
+            return str(value)
+        elif param_type is int:
+            return int(float(value))  # Handle cases where value might be a float string
+        elif param_type is float:
+            return float(value)
+        elif param_type is bool:
+            if isinstance(value, str):
+                return value.lower() in ("true", "1", "yes", "on")
+            return bool(value)
+    except (TypeError, ValueError, OverflowError):
+        # Values that don't convert (e.g. "6cm" for an int) are compared as-is
+        return value
 
     return value
 
@@ -91,17 +97,21 @@ def coerce_arguments(arguments: Dict[str, Any], func_name: str) -> Dict[str, Any
     return coerced
 
 
-def load_conversation_logs(
+def load_choice_logs(
     filename: str,
-) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+) -> Dict[Tuple[int, int], Dict[int, List[Dict[str, Any]]]]:
     """
-    Load conversation logs from a JSONL file.
+    Load conversation logs from a JSONL file, keeping every sampled choice.
+
+    Lines without a choice_index (runs without --samples-per-turn) are
+    treated as choice 0.
 
     Args:
         filename: Path to the JSONL file
 
     Returns:
-        Dictionary mapping (sample_id, turn_id) tuples to tool_calls lists
+        Dictionary mapping (sample_id, turn_id) tuples to a dictionary of
+        choice_index to tool_calls lists
     """
     logs = {}
 
@@ -111,10 +121,11 @@ def load_conversation_logs(
                 data = json.loads(line.strip())
                 sample_id = data.get("sample_id")
                 turn_id = data.get("turn_id")
+                choice_index = data.get("choice_index", 0)
                 tool_calls = data.get("tool_calls", [])
 
                 if sample_id is not None and turn_id is not None:
-                    logs[(sample_id, turn_id)] = tool_calls
+                    logs.setdefault((sample_id, turn_id), {})[choice_index] = tool_calls
                 else:
                     print(f"Warning: Line {line_num} missing sample_id or turn_id")
 
@@ -125,6 +136,28 @@ def load_conversation_logs(
     return logs
 
 
+def first_choices(
+    choice_logs: Dict[Tuple[int, int], Dict[int, List[Dict[str, Any]]]],
+) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+    """Keep only the lowest choice_index of each turn, for file comparisons."""
+    return {key: choices[min(choices)] for key, choices in choice_logs.items()}
+
+
+def load_conversation_logs(
+    filename: str,
+) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+    """
+    Load conversation logs from a JSONL file.
+
+    Args:
+        filename: Path to the JSONL file
+
+    Returns:
+        Dictionary mapping (sample_id, turn_id) tuples to tool_calls lists
+    """
+    return first_choices(load_choice_logs(filename))
+
+
 def normalize_tool_calls(tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Normalize tool calls for comparison by sorting and removing call_id.
@@ -194,6 +227,62 @@ def normalize_tool_calls_with_coercion(
     )
 
 
+# Counter in compare_tool_calls results for each comparison status
+STATUS_COUNTERS = {
+    "match": "matching",
+    "diff": "different",
+    "typediff": "typediff",
+    "missing1": "missing_in_file1",
+    "missing2": "missing_in_file2",
+    "file1_only": "file1_has_tools_file2_empty",
+    "file2_only": "file2_has_tools_file1_empty",
+}
+
+
+def classify_tool_calls(
+    tool_calls1: List[Dict[str, Any]], tool_calls2: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Compare the tool calls of one turn that exists in both files.
+
+    Args:
+        tool_calls1: Tool calls from the first file
+        tool_calls2: Tool calls from the second file
+
+    Returns:
+        Dictionary with the status ("match", "typediff", "diff", "file1_only"
+        or "file2_only") and, for mismatches, the normalized (and coerced)
+        tool calls that were compared
+    """
+    has_tools1 = len(tool_calls1) > 0
+    has_tools2 = len(tool_calls2) > 0
+
+    # Check for cases where one has tools and the other is empty
+    if has_tools1 and not has_tools2:
+        return {"status": "file1_only"}
+    if has_tools2 and not has_tools1:
+        return {"status": "file2_only"}
+
+    # Both have tools or both are empty, compare normally
+    normalized1 = normalize_tool_calls(tool_calls1)
+    normalized2 = normalize_tool_calls(tool_calls2)
+    if normalized1 == normalized2:
+        return {"status": "match"}
+
+    # Check if they match after type coercion
+    coerced1 = normalize_tool_calls_with_coercion(tool_calls1)
+    coerced2 = normalize_tool_calls_with_coercion(tool_calls2)
+    if coerced1 == coerced2:
+        return {
+            "status": "typediff",
+            "normalized1": normalized1,
+            "normalized2": normalized2,
+            "coerced1": coerced1,
+            "coerced2": coerced2,
+        }
+    return {"status": "diff", "normalized1": normalized1, "normalized2": normalized2}
+
+
 def compare_tool_calls(
     file1_logs: Dict[Tuple[int, int], List[Dict[str, Any]]],
     file2_logs: Dict[Tuple[int, int], List[Dict[str, Any]]],
@@ -229,112 +318,107 @@ def compare_tool_calls(
         results["total_comparisons"] += 1
 
         # Check if entry exists in both files
-        exists_in_file1 = (sample_id, turn_id) in file1_logs
-        exists_in_file2 = (sample_id, turn_id) in file2_logs
-
-        if not exists_in_file1:
-            results["missing_in_file1"] += 1
-            results["differences"].append(
-                {
-                    "sample_id": sample_id,
-                    "turn_id": turn_id,
-                    "status": "missing1",
-                    "file1_tool_calls": [],
-                    "file2_tool_calls": tool_calls2,
-                }
-            )
-        elif not exists_in_file2:
-            results["missing_in_file2"] += 1
-            results["differences"].append(
-                {
-                    "sample_id": sample_id,
-                    "turn_id": turn_id,
-                    "status": "missing2",
-                    "file1_tool_calls": tool_calls1,
-                    "file2_tool_calls": [],
-                }
-            )
+        if (sample_id, turn_id) not in file1_logs:
+            comparison = {"status": "missing1"}
+        elif (sample_id, turn_id) not in file2_logs:
+            comparison = {"status": "missing2"}
         else:
-            # Both entries exist, compare tool calls
-            has_tools1 = len(tool_calls1) > 0
-            has_tools2 = len(tool_calls2) > 0
-
-            # Check for cases where one has tools and the other is empty
-            if has_tools1 and not has_tools2:
-                results["file1_has_tools_file2_empty"] += 1
-                results["differences"].append(
-                    {
-                        "sample_id": sample_id,
-                        "turn_id": turn_id,
-                        "status": "file1_only",
-                        "file1_tool_calls": tool_calls1,
-                        "file2_tool_calls": tool_calls2,
-                    }
-                )
-            elif has_tools2 and not has_tools1:
-                results["file2_has_tools_file1_empty"] += 1
-                results["differences"].append(
-                    {
-                        "sample_id": sample_id,
-                        "turn_id": turn_id,
-                        "status": "file2_only",
-                        "file1_tool_calls": tool_calls1,
-                        "file2_tool_calls": tool_calls2,
-                    }
-                )
-            else:
-                # Both have tools or both are empty, compare normally
-                normalized1 = normalize_tool_calls(tool_calls1)
-                normalized2 = normalize_tool_calls(tool_calls2)
-
-                if normalized1 == normalized2:
-                    results["matching"] += 1
-                    results["differences"].append(
-                        {
-                            "sample_id": sample_id,
-                            "turn_id": turn_id,
-                            "status": "match",
-                            "file1_tool_calls": tool_calls1,
-                            "file2_tool_calls": tool_calls2,
-                        }
-                    )
-                else:
-                    # Check if they match after type coercion
-                    coerced1 = normalize_tool_calls_with_coercion(tool_calls1)
-                    coerced2 = normalize_tool_calls_with_coercion(tool_calls2)
-
-                    if coerced1 == coerced2:
-                        results["typediff"] += 1
-                        results["differences"].append(
-                            {
-                                "sample_id": sample_id,
-                                "turn_id": turn_id,
-                                "status": "typediff",
-                                "file1_tool_calls": tool_calls1,
-                                "file2_tool_calls": tool_calls2,
-                                "normalized1": normalized1,
-                                "normalized2": normalized2,
-                                "coerced1": coerced1,
-                                "coerced2": coerced2,
-                            }
-                        )
-                    else:
-                        results["different"] += 1
-                        results["differences"].append(
-                            {
-                                "sample_id": sample_id,
-                                "turn_id": turn_id,
-                                "status": "diff",
-                                "file1_tool_calls": tool_calls1,
-                                "file2_tool_calls": tool_calls2,
-                                "normalized1": normalized1,
-                                "normalized2": normalized2,
-                            }
-                        )
+            comparison = classify_tool_calls(tool_calls1, tool_calls2)
+
+        status = comparison.pop("status")
+        results[STATUS_COUNTERS[status]] += 1
+        results["differences"].append(
+            {
+                "sample_id": sample_id,
+                "turn_id": turn_id,
+                "status": status,
+                "file1_tool_calls": tool_calls1,
+                "file2_tool_calls": tool_calls2,
+                **comparison,
+            }
+        )
 
     return results
 
 
+def compute_agreement(
+    choice_logs: Dict[Tuple[int, int], Dict[int, List[Dict[str, Any]]]],
+) -> Dict[str, Any]:
+    """
+    Measure how consistently the sampled choices of each sample call tools.
+
+    A turn's agreement is the share of its choices whose tool calls (after
+    normalization and type coercion) equal the most common set of calls.
+    A sample's rate averages its turns that have more than one choice.
+
+    Args:
+        choice_logs: Tool calls per turn and choice, from load_choice_logs
+
+    Returns:
+        Dictionary with per-sample rates and the overall rate, averaged over
+        samples
+    """
+    turn_rates: Dict[int, List[float]] = {}
+    choice_counts: Dict[int, int] = {}
+
+    for (sample_id, _turn_id), choices in sorted(choice_logs.items()):
+        if len(choices) < 2:
+            continue
+        keys = [
+            json.dumps(normalize_tool_calls_with_coercion(tool_calls), sort_keys=True)
+            for tool_calls in choices.values()
+        ]
+        modal_count = max(keys.count(key) for key in set(keys))
+        turn_rates.setdefault(sample_id, []).append(modal_count / len(keys))
+        choice_counts[sample_id] = max(choice_counts.get(sample_id, 0), len(keys))
+
+    samples = [
+        {
+            "sample_id": sample_id,
+            "choices": choice_counts[sample_id],
+            "turns": len(rates),
+            "agreement": sum(rates) / len(rates),
+        }
+        for sample_id, rates in sorted(turn_rates.items())
+    ]
+    overall = (
+        sum(sample["agreement"] for sample in samples) / len(samples)
+        if samples
+        else None
+    )
+    return {"samples": samples, "overall": overall}
+
+
+def print_agreement_results(agreement: Dict[str, Any], file_name: str):
+    """
+    Print per-sample agreement rates between sampled choices.
+
+    Args:
+        agreement: Result of compute_agreement
+        file_name: Name of the file the choices were loaded from
+    """
+    console = Console()
+
+    print(f"\n=== Choice Agreement: {file_name} ===\n")
+    print(f"Overall agreement: {agreement['overall']:.1%}")
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Sample", style="cyan", width=8)
+    table.add_column("Choices", style="cyan", width=8)
+    table.add_column("Turns", style="cyan", width=6)
+    table.add_column("Agreement", style="yellow", width=10)
+
+    for sample in agreement["samples"]:
+        table.add_row(
+            str(sample["sample_id"]),
+            str(sample["choices"]),
+            str(sample["turns"]),
+            f"{sample['agreement']:.1%}",
+        )
+
+    console.print(table)
+
+
 def print_comparison_results(results: Dict[str, Any], file1_name: str, file2_name: str):
     """
     Print formatted comparison results in a side-by-side table format.
@@ -452,27 +536,62 @@ def main():
     )
     parser.add_argument("file1", help="First conversation log file")
     parser.add_argument("file2", help="Second conversation log file")
+    parser.add_argument(
+        "--profile",
+        choices=["cpu", "mem"],
+        help="Profile with cProfile (cpu) or tracemalloc (mem) and print per-phase times (load, compare, render)",
+    )
+    parser.add_argument(
+        "--profile-output",
+        default="profile_score",
+        help="Path prefix of the files written by --profile (default: profile_score)",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=15,
+        help="Functions or allocation sites listed in the --profile summary (default: 15)",
+    )
 
     if len(sys.argv) == 1:
         parser.print_help()
         sys.exit(1)
 
     args = parser.parse_args()
+    if args.profile:
+        profiler.configure(args.profile, args.profile_output, args.profile_top)
 
     # Load both files
-    print(f"Loading {args.file1}...")
-    file1_logs = load_conversation_logs(args.file1)
-    print(f"Loaded {len(file1_logs)} entries from {args.file1}")
-
-    print(f"Loading {args.file2}...")
-    file2_logs = load_conversation_logs(args.file2)
-    print(f"Loaded {len(file2_logs)} entries from {args.file2}")
-
-    # Compare tool calls
-    results = compare_tool_calls(file1_logs, file2_logs)
+    with profiler.phase("load"):
+        print(f"Loading {args.file1}...")
+        file1_choices = load_choice_logs(args.file1)
+        file1_logs = first_choices(file1_choices)
+        print(f"Loaded {len(file1_logs)} entries from {args.file1}")
+
+        print(f"Loading {args.file2}...")
+        file2_choices = load_choice_logs(args.file2)
+        file2_logs = first_choices(file2_choices)
+        print(f"Loaded {len(file2_logs)} entries from {args.file2}")
+
+    # Compare tool calls (the first choice of each turn when several were sampled)
+    with profiler.phase("compare"):
+        results = compare_tool_calls(file1_logs, file2_logs)
+        agreements = [
+            (file_name, compute_agreement(choice_logs))
+            for file_name, choice_logs in (
+                (args.file1, file1_choices),
+                (args.file2, file2_choices),
+            )
+        ]
 
     # Print results
-    print_comparison_results(results, args.file1, args.file2)
+    with profiler.phase("render"):
+        print_comparison_results(results, args.file1, args.file2)
+
+        # Report agreement between sampled choices (--samples-per-turn runs)
+        for file_name, agreement in agreements:
+            if agreement["samples"]:
+                print_agreement_results(agreement, file_name)
 
 
 if __name__ == "__main__":
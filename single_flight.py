@@ -0,0 +1,110 @@
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def _jsonable(obj):
+    # API message objects (e.g. ChatCompletionMessage) sent back in the history
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_unset=True)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def request_key(
+    api: str, request_params: Dict[str, Any], endpoint: Optional[str] = None
+) -> Optional[str]:
+    """Build a canonical key for an API request, or None if it can't be serialized.
+
+    Args:
+        api: Name of the endpoint, e.g. "chat.completions"
+        request_params: Keyword arguments passed to the create call
+        endpoint: Base URL the request is sent to, when requests to
+            different servers must get different keys
+
+    Returns:
+        Key string identical for byte-identical requests
+    """
+    try:
+        body = json.dumps(
+            request_params, sort_keys=True, separators=(",", ":"), default=_jsonable
+        )
+    except (TypeError, ValueError):
+        return None
+    if endpoint is not None:
+        return f"{endpoint} {api}:{body}"
+    return f"{api}:{body}"
+
+
+class SingleFlight:
+    """Share one in-flight call among concurrent identical requests.
+
+    The first caller for a key runs the call; callers arriving with the same
+    key before it returns wait for it and get the same result (or exception).
+    Nothing is kept after the call completes, so only truly concurrent
+    duplicates are coalesced. Only use this where identical requests are
+    expected to get equivalent responses, e.g. at temperature 0.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._calls = 0
+        self._saved = 0
+
+    def call(
+        self, make_key: Callable[[], Optional[str]], func: Callable[[], Any]
+    ) -> Tuple[Any, bool]:
+        """Run func, or wait for an identical in-flight call with the same key.
+
+        Args:
+            make_key: Builds the request key, e.g. with request_key; only
+                called when coalescing is enabled. A None key disables
+                coalescing for the call
+            func: Zero-argument function making the request
+
+        Returns:
+            Tuple of (result of func, shared), where shared is True when the
+            result came from another caller's call. Run-wide totals (e.g.
+            token usage) should only count unshared results.
+        """
+        if not self.enabled:
+            return func(), False
+        key = make_key()
+        if key is None:
+            return func(), False
+
+        with self._lock:
+            self._calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._saved += 1
+                leader = False
+            else:
+                future = Future()
+                self._in_flight[key] = future
+                leader = True
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def report(self) -> str:
+        """Format how many API calls were saved, for printing at the end of a run."""
+        with self._lock:
+            calls, saved = self._calls, self._saved
+        if not calls:
+            return "Request coalescing: no API calls"
+        return f"Request coalescing: {saved}/{calls} API calls shared an in-flight response ({saved / calls:.1%})"
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def non_cacheable(func):
+    """Mark a tool function so its results are never memoized.
+
+    Use this for tools with side effects or results that depend on state
+    outside their arguments (e.g. searching an uploaded vector store).
+    """
+    func._cacheable = False
+    return func
+
+
+def depends_on_files(*paths: str):
+    """Mark a tool whose results depend on the contents of data files.
+
+    The files' sizes and modification times become part of the tool's cache
+    fingerprint, so persisted results are not reused after the data changes.
+    """
+
+    def mark(func):
+        func._data_files = paths
+        return func
+
+    return mark
+
+
+def is_cacheable(func) -> bool:
+    """Return True unless the tool was marked with non_cacheable."""
+    return getattr(func, "_cacheable", True)
+
+
+class ToolResultCache:
+    """LRU cache of tool results keyed by tool name and canonical arguments.
+
+    Each entry holds both the raw result and its JSON-serialized output string,
+    so a hit skips the tool call and the json.dumps of its result. When a path
+    is given, outputs are also persisted to a SQLite file and reused by later
+    runs. Keys include a fingerprint of the tool's bytecode, and of the data
+    files declared with depends_on_files, so editing a tool or its data
+    invalidates its persisted entries.
+    """
+
+    def __init__(self, max_entries: int = 4096, path: Optional[str] = None):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[Any, str] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tool_results (key TEXT PRIMARY KEY, output TEXT)"
+            )
+            self._db.commit()
+
+    def make_key(
+        self, name: str, func, converted_args: Dict[str, Any]
+    ) -> Optional[str]:
+        """Build the cache key for a call, or None if the arguments can't be canonicalized.
+
+        Args:
+            name: Name the tool is registered under
+            func: The tool function
+            converted_args: Arguments after type conversion
+
+        Returns:
+            Cache key string, or None when the call should not be cached
+        """
+        try:
+            canonical_args = json.dumps(
+                converted_args, sort_keys=True, separators=(",", ":")
+            )
+        except (TypeError, ValueError):
+            return None
+        return f"{name}:{self._fingerprint(func)}:{canonical_args}"
+
+    def get(self, name: str, key: str) -> Optional[Tuple[Any, str]]:
+        """Look up a cached (result, output) pair and record a hit or miss.
+
+        Args:
+            name: Tool name, used for per-tool hit rates
+            key: Cache key from make_key
+
+        Returns:
+            Tuple of (result, serialized output), or None on a miss
+        """
+        with self._lock:
+            stats = self._stats.setdefault(name, {"hits": 0, "misses": 0})
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT output FROM tool_results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (json.loads(row[0]), row[0])
+                    self._insert(key, entry)
+            if entry is None:
+                stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            stats["hits"] += 1
+            return entry
+
+    def put(self, key: str, result: Any, output: str):
+        """Store a tool result and its serialized output.
+
+        Args:
+            key: Cache key from make_key
+            result: The value returned by the tool
+            output: json.dumps(result)
+        """
+        with self._lock:
+            self._insert(key, (result, output))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO tool_results (key, output) VALUES (?, ?)",
+                    (key, output),
+                )
+                self._db.commit()
+
+    def _insert(self, key: str, entry: Tuple[Any, str]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _fingerprint(self, func) -> str:
+        fingerprint = self._fingerprints.get(func)
+        if fingerprint is None:
+            code = getattr(func, "__code__", None)
+            source = (
+                code.co_code + repr(code.co_consts).encode()
+                if code is not None
+                else repr(func).encode()
+            )
+            for path in getattr(func, "_data_files", ()):
+                try:
+                    stat = os.stat(path)
+                    source += f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+                except OSError:
+                    source += f"{path}:missing".encode()
+            fingerprint = hashlib.sha256(source).hexdigest()[:12]
+            self._fingerprints[func] = fingerprint
+        return fingerprint
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return a copy of the per-tool hit and miss counters."""
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
+
+    def report(self) -> str:
+        """Format overall and per-tool hit rates for printing at the end of a run."""
+        stats = self.stats()
+        hits = sum(counts["hits"] for counts in stats.values())
+        lookups = hits + sum(counts["misses"] for counts in stats.values())
+        if not lookups:
+            return "Tool cache: no cacheable tool calls"
+        lines = [f"Tool cache: {hits}/{lookups} hits ({hits / lookups:.1%} hit rate)"]
+        for name, counts in sorted(stats.items()):
+            total = counts["hits"] + counts["misses"]
+            lines.append(
+                f"  {name}: {counts['hits']}/{total} hits ({counts['hits'] / total:.1%})"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,109 @@
+import functools
+import json
+import os
+import sys
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Directory holding the canary datasets used by sample_tools. Point
+# CANARY_TOOL_DATA_DIR at another directory to use larger datasets.
+DATA_DIR = os.getenv(
+    "CANARY_TOOL_DATA_DIR", os.path.join(os.path.dirname(__file__), "data")
+)
+
+
+def data_path(filename: str) -> str:
+    """Return the path of a dataset file in DATA_DIR."""
+    return os.path.join(DATA_DIR, filename)
+
+
+def _read_jsonl(filename: str) -> Iterator[Dict]:
+    """Yield one row per non-empty line of a JSONL file in DATA_DIR."""
+    with open(data_path(filename), "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class RouteIndex:
+    """Bidirectional (from_city, to_city) -> routes index.
+
+    Routes listed in the data file are indexed as given. Each pair without an
+    explicit route in the opposite direction also gets a reversed copy, built
+    once at load time, so lookups never allocate.
+    """
+
+    def __init__(self, rows: Iterator[Dict], reverse: Callable[[Dict], Dict]):
+        self._routes: Dict[Tuple[str, str], List[Dict]] = {}
+        for row in rows:
+            key = (sys.intern(row.pop("from_city")), sys.intern(row.pop("to_city")))
+            self._routes.setdefault(key, []).append(row)
+
+        # Add the reverse direction only where the data doesn't define it
+        reversed_routes = {}
+        for (from_city, to_city), routes in self._routes.items():
+            if (to_city, from_city) not in self._routes:
+                reversed_routes[(to_city, from_city)] = [
+                    reverse(route) for route in routes
+                ]
+        self._routes.update(reversed_routes)
+
+    def get(self, from_city: str, to_city: str) -> Optional[List[Dict]]:
+        """Return the routes between two normalized city names, or None."""
+        return self._routes.get((from_city, to_city))
+
+
+class VenueIndex:
+    """City -> venues index with a city alias table (e.g. NYC -> New York)."""
+
+    def __init__(self, rows: Iterator[Dict], aliases: Dict[str, str]):
+        self._venues: Dict[str, List[Dict]] = {}
+        for row in rows:
+            self._venues.setdefault(sys.intern(row.pop("city")), []).append(row)
+        self._aliases = {alias.title(): city for alias, city in aliases.items()}
+
+    def get(self, city: str) -> Optional[List[Dict]]:
+        """Return the venues for a normalized city name, or None."""
+        return self._venues.get(city)
+
+    def resolve_alias(self, city: str) -> Optional[str]:
+        """Return the canonical city name for an alias, or None."""
+        return self._aliases.get(city)
+
+
+def _reverse_train(route: Dict) -> Dict:
+    # Swap arrival and departure times for reverse routes
+    return {
+        "departure": route["arrival"],
+        "arrival": route["departure"],
+        "train": route["train"],
+    }
+
+
+def _reverse_flight(flight: Dict) -> Dict:
+    # For reverse routes, swap times and adjust flight numbers
+    return {
+        "departure": flight["arrival"],
+        "arrival": flight["departure"],
+        "airline": flight["airline"],
+        "flight": flight["flight"] + "R",  # Add R for return flight
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def train_routes() -> RouteIndex:
+    """Load the train timetable once and return its route index."""
+    return RouteIndex(_read_jsonl("trains.jsonl"), _reverse_train)
+
+
+@functools.lru_cache(maxsize=None)
+def flight_routes() -> RouteIndex:
+    """Load the flight timetable once and return its route index."""
+    return RouteIndex(_read_jsonl("flights.jsonl"), _reverse_flight)
+
+
+@functools.lru_cache(maxsize=None)
+def refreshment_venues() -> VenueIndex:
+    """Load the refreshment venues and city aliases once and return their index."""
+    with open(data_path("city_aliases.json"), "r") as f:
+        aliases = json.load(f)
+    return VenueIndex(_read_jsonl("refreshments.jsonl"), aliases)
@@ -0,0 +1,138 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class _NoopSpan:
+    """Span returned while tracing is disabled; does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    """A timed span recorded as a complete ("X") trace event on exit."""
+
+    __slots__ = ("_tracer", "_name", "_args", "_start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self._args["error"] = f"{exc_type.__name__}: {exc}"
+        self._tracer._record(self._name, self._start, end, self._args)
+        return False
+
+    def set(self, **attrs):
+        """Attach extra attributes to the span (e.g. values known only at the end)."""
+        self._args.update(attrs)
+
+
+class Tracer:
+    """Collects nested spans and exports them in Chrome trace-event format.
+
+    The output file can be opened in https://ui.perfetto.dev or chrome://tracing.
+    Spans nest by time on each thread, so a conversation span contains its turn
+    spans, which contain API call, tool call and log write spans.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._path: Optional[str] = None
+        self._events: List[Dict[str, Any]] = []
+        self._thread_names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def configure(self, path: str):
+        """Enable tracing and export to path when the process exits.
+
+        Args:
+            path: Output file for the trace-event JSON
+        """
+        self._path = path
+        self.enabled = True
+        atexit.register(self.export)
+
+    def span(self, name: str, /, **attrs):
+        """Return a context manager timing the enclosed block.
+
+        Args:
+            name: Span name shown in the trace viewer
+            **attrs: Attributes recorded on the span
+
+        Returns:
+            A span context manager (a shared no-op when tracing is disabled)
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, attrs)
+
+    def _record(self, name: str, start_ns: int, end_ns: int, args: Dict[str, Any]):
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self._pid,
+            "tid": thread.ident,
+            "args": args,
+        }
+        with self._lock:
+            self._events.append(event)
+            self._thread_names.setdefault(thread.ident, thread.name)
+
+    def export(self):
+        """Write all recorded spans to the configured trace file."""
+        if not self._path:
+            return
+        with self._lock:
+            events = list(self._events)
+            thread_names = dict(self._thread_names)
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in thread_names.items()
+        ]
+        try:
+            with open(self._path, "w") as f:
+                json.dump(
+                    {"traceEvents": metadata + events, "displayTimeUnit": "ms"},
+                    f,
+                    default=str,
+                )
+        except Exception as e:
+            print(f"Warning: Failed to write trace file {self._path}: {e}")
+
+
+# Process-wide tracer shared by generate.py and the tool helpers
+tracer = Tracer()
@@ -0,0 +1,136 @@
+import threading
+import time
+from typing import Optional
+
+from usage_stats import usage_counts
+
+# Truncation reasons that stop the whole conversation, not just the turn
+INTERRUPT_REASONS = ("cancelled", "run_deadline", "conversation_deadline")
+
+
+class TurnLimits:
+    """Limits on the tool-calling loop of each turn and on each conversation.
+
+    Every limit is optional; None means unbounded. The run can also be
+    cancelled (e.g. on SIGINT), which every conversation sees before its
+    next request.
+
+    Args:
+        max_tool_rounds: Tool-call rounds allowed per turn before it is cut off
+        max_conversation_tokens: Total tokens (prompt + completion) a
+            conversation may use; later requests are not sent once reached
+        max_turn_seconds: Wall time per turn after which no further request
+            is sent for it
+        conversation_seconds: Wall time per conversation after which it stops
+        run_seconds: Wall time from now after which every conversation stops
+    """
+
+    def __init__(
+        self,
+        max_tool_rounds: Optional[int] = None,
+        max_conversation_tokens: Optional[int] = None,
+        max_turn_seconds: Optional[float] = None,
+        conversation_seconds: Optional[float] = None,
+        run_seconds: Optional[float] = None,
+    ):
+        self.max_tool_rounds = max_tool_rounds
+        self.max_conversation_tokens = max_conversation_tokens
+        self.max_turn_seconds = max_turn_seconds
+        self.conversation_seconds = conversation_seconds
+        self.run_deadline = (
+            time.monotonic() + run_seconds if run_seconds is not None else None
+        )
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop every conversation before its next request."""
+        self._cancelled.set()
+
+    def run_stopped(self) -> Optional[str]:
+        """Return "cancelled" or "run_deadline" once the run must stop, else None."""
+        if self._cancelled.is_set():
+            return "cancelled"
+        if self.run_deadline is not None and time.monotonic() >= self.run_deadline:
+            return "run_deadline"
+        return None
+
+    def new_budget(self) -> "ConversationBudget":
+        """Start tracking a new conversation against these limits."""
+        return ConversationBudget(self)
+
+
+class ConversationBudget:
+    """Tracks one conversation's token use and its current turn's rounds and time.
+
+    Call start_turn at the start of each turn, record_usage for each API
+    response and record_tool_round after each round of tool calls. The
+    current turn's token usage is kept in turn_usage for logging. check()
+    is called before each request and returns the reason the turn has to stop,
+    if any. The reason stays in truncation_reason until the next turn starts.
+    interrupted() tells whether the rest of the conversation has to stop.
+    """
+
+    def __init__(self, limits: TurnLimits):
+        self.limits = limits
+        self.tokens_used = 0
+        self.turn_usage = usage_counts(None)
+        self.tool_rounds = 0
+        self.truncation_reason: Optional[str] = None
+        self._turn_start = time.monotonic()
+        self._conversation_start = self._turn_start
+
+    def start_turn(self):
+        self.turn_usage = usage_counts(None)
+        self.tool_rounds = 0
+        self.truncation_reason = None
+        self._turn_start = time.monotonic()
+
+    def record_usage(self, usage):
+        """Add a response's token usage (a usage object, dict or None)."""
+        counts = usage_counts(usage)
+        self.tokens_used += counts["total_tokens"]
+        for key, value in counts.items():
+            self.turn_usage[key] += value
+
+    def record_tool_round(self):
+        self.tool_rounds += 1
+
+    def interrupted(self) -> Optional[str]:
+        """Return why the conversation must stop (cancellation or a deadline), or None."""
+        limits = self.limits
+        reason = limits.run_stopped()
+        if reason is None and (
+            limits.conversation_seconds is not None
+            and time.monotonic() - self._conversation_start
+            >= limits.conversation_seconds
+        ):
+            reason = "conversation_deadline"
+        return reason
+
+    def check(self) -> Optional[str]:
+        """Return the name of the limit that stops the current turn, or None."""
+        limits = self.limits
+        interrupted = self.interrupted()
+        if interrupted is not None:
+            self.truncation_reason = interrupted
+        elif (
+            limits.max_conversation_tokens is not None
+            and self.tokens_used >= limits.max_conversation_tokens
+        ):
+            self.truncation_reason = "max_conversation_tokens"
+        elif (
+            limits.max_tool_rounds is not None
+            and self.tool_rounds >= limits.max_tool_rounds
+        ):
+            self.truncation_reason = "max_tool_rounds"
+        elif (
+            limits.max_turn_seconds is not None
+            and time.monotonic() - self._turn_start >= limits.max_turn_seconds
+        ):
+            self.truncation_reason = "max_turn_seconds"
+        return self.truncation_reason
+
+    @property
+    def status(self) -> str:
+        """Turn status for the log: "truncated" or "completed"."""
+        return "truncated" if self.truncation_reason else "completed"
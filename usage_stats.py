@@ -0,0 +1,83 @@
+import threading
+from typing import Dict
+
+
+def _field(obj, name):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_counts(usage) -> Dict[str, int]:
+    """Normalize a chat.completions or responses usage object (or dict).
+
+    Returns:
+        Dict with prompt_tokens, completion_tokens, cached_tokens and
+        total_tokens, all 0 when the endpoint reported no usage
+    """
+    prompt_tokens = _field(usage, "prompt_tokens")
+    if prompt_tokens is None:
+        # Responses API naming
+        prompt_tokens = _field(usage, "input_tokens")
+        completion_tokens = _field(usage, "output_tokens")
+        details = _field(usage, "input_tokens_details")
+    else:
+        completion_tokens = _field(usage, "completion_tokens")
+        details = _field(usage, "prompt_tokens_details")
+    prompt_tokens = prompt_tokens or 0
+    completion_tokens = completion_tokens or 0
+    total_tokens = _field(usage, "total_tokens") or prompt_tokens + completion_tokens
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": _field(details, "cached_tokens") or 0,
+        "total_tokens": total_tokens,
+    }
+
+
+class UsageStats:
+    """Run-wide token usage, including prompt tokens served from the provider's cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {
+            "requests": 0,
+            "cache_hit_requests": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+        }
+
+    def record(self, usage):
+        """Add one API response's usage."""
+        counts = usage_counts(usage)
+        with self._lock:
+            self._totals["requests"] += 1
+            if counts["cached_tokens"]:
+                self._totals["cache_hit_requests"] += 1
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                self._totals[key] += counts[key]
+
+    def totals(self) -> Dict[str, int]:
+        """Return a copy of the run totals."""
+        with self._lock:
+            return dict(self._totals)
+
+    def report(self) -> str:
+        """Format token usage and prompt cache hit rates for printing at the end of a run."""
+        totals = self.totals()
+        if not totals["requests"]:
+            return "Token usage: no API responses"
+        lines = [
+            f"Token usage: {totals['prompt_tokens']:,} prompt, "
+            f"{totals['completion_tokens']:,} completion over {totals['requests']} requests"
+        ]
+        if totals["prompt_tokens"]:
+            lines.append(
+                f"Prompt cache: {totals['cached_tokens']:,}/{totals['prompt_tokens']:,} prompt tokens cached "
+                f"({totals['cached_tokens'] / totals['prompt_tokens']:.1%}), "
+                f"{totals['cache_hit_requests']}/{totals['requests']} requests with cache hits"
+            )
+        return "\n".join(lines)